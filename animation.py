@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageSequence
+
+import batch_convert
+from batch_convert import _init_worker, collect_inputs
+
+# Frames converted but not yet written, per worker, so memory stays flat however long the animation is
+WINDOW_PER_WORKER = 4
+
+
+def natural_key(path):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", os.path.basename(path))]
+
+
+def is_animated(path):
+    try:
+        with Image.open(path) as image:
+            return getattr(image, "n_frames", 1) > 1
+    except Exception:
+        return False
+
+
+def iter_frames(specs, converter):
+    # Yields (hash, source) per frame, source being a grid sized image or a path for a worker to load
+    if len(specs) == 1 and os.path.isfile(specs[0]) and is_animated(specs[0]):
+        with Image.open(specs[0]) as image:
+            width, height = image.size
+            if converter.max_source_pixels and width * height > converter.max_source_pixels:
+                raise ValueError(f"image is {width}x{height}, over the {converter.max_source_pixels} pixel limit")
+            for frame in ImageSequence.Iterator(image):
+                # Only the grid sized frame goes to the workers, and identical grids give identical output
+                resized = converter.resize_image_to_grid(frame.convert("RGBA"))
+                data = resized.tobytes()
+                yield hashlib.blake2b(data, digest_size=16).digest(), (resized.mode, resized.size, data)
+        return
+
+    for path in sorted(collect_inputs(specs), key=natural_key):
+        with open(path, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).digest()
+        yield digest, path
+
+
+def frame_output_path(specs, index, output_dir=None, extension=".txt"):
+    first = specs[0].lstrip("@")
+    if os.path.isdir(first):
+        folder, stem = first, os.path.basename(os.path.normpath(first))
+    else:
+        folder, stem = os.path.dirname(first), os.path.splitext(os.path.basename(first))[0]
+        stem = stem.replace("*", "").replace("?", "") or "frame"
+    return os.path.join(output_dir or folder, f"{stem}_{index:04d}{extension}")
+
+
+def _convert_frame(job):
+    source, preserve_colors, encoding = job
+    converter = batch_convert._worker_converter
+    if isinstance(source, str):
+        original = converter.load_png_image(source)
+        image = converter.resize_image_to_grid(original)
+    else:
+        mode, size, data = source
+        image = original = Image.frombytes(mode, size, data)
+
+    if preserve_colors:
+        indices = converter.quantize_to_indices(image)
+    else:
+        # Animated frames only reach the workers grid sized, so they are clustered at that size
+        indices = converter.cluster_to_indices(original, image)
+    return bytes(converter.serialize_indices(indices, encoding))
+
+
+def convert_frames(specs, output_dir=None, workers=None, preserve_colors=True, converter_options=None,
+                   encoding="text"):
+    # Yields (index, output_path, duplicate_of) in frame order as each file is written
+    converter_options = converter_options or {}
+    workers = max(1, workers or os.cpu_count() or 1)
+    extension = batch_convert.output_extension(encoding)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    _init_worker(converter_options)
+    converter = batch_convert._worker_converter
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(converter_options,))
+
+    seen = {}
+    pending = deque()
+
+    def finish(entry):
+        index, output_path, duplicate_of, work = entry
+        if duplicate_of is not None:
+            shutil.copyfile(duplicate_of, output_path)
+        else:
+            data = work.result() if executor is not None else work
+            with open(output_path, "wb") as f:
+                f.write(data)
+        return index, output_path, duplicate_of
+
+    try:
+        for index, (digest, source) in enumerate(iter_frames(specs, converter)):
+            output_path = frame_output_path(specs, index, output_dir, extension)
+            duplicate_of = seen.get(digest)
+            work = None
+            if duplicate_of is None:
+                seen[digest] = output_path
+                job = (source, preserve_colors, encoding)
+                work = executor.submit(_convert_frame, job) if executor is not None else _convert_frame(job)
+            pending.append((index, output_path, duplicate_of, work))
+
+            while len(pending) >= workers * WINDOW_PER_WORKER:
+                yield finish(pending.popleft())
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def run_animation(specs, output_dir=None, workers=None, preserve_colors=True, converter_options=None,
+                  encoding="text"):
+    summary = {"frames": 0, "converted": 0, "duplicates": 0, "elapsed": 0.0, "frames_per_second": 0.0}
+    start = time.perf_counter()
+    for index, output_path, duplicate_of in convert_frames(specs, output_dir, workers, preserve_colors,
+                                                           converter_options, encoding):
+        summary["frames"] += 1
+        if duplicate_of is not None:
+            summary["duplicates"] += 1
+            print(f"frame {index} -> {output_path} (same as {os.path.basename(duplicate_of)})")
+        else:
+            summary["converted"] += 1
+            print(f"frame {index} -> {output_path}")
+
+    summary["elapsed"] = time.perf_counter() - start
+    if summary["elapsed"] > 0:
+        summary["frames_per_second"] = summary["frames"] / summary["elapsed"]
+
+    print(f"\nWrote {summary['frames']} frames ({summary['duplicates']} duplicates skipped) in "
+          f"{summary['elapsed']:.2f}s ({summary['frames_per_second']:.1f} frames/s)")
+    return summary
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from instrumentation import Instrumentation, cancel_hook
+from png_converter import ConversionResult, convert_source, shared_converter
+
+
+def _run_job(source, preserve_colors, options, cancelled=None):
+    instrumentation = Instrumentation(hooks=[cancel_hook(cancelled)] if cancelled is not None else None)
+    result = convert_source(source, preserve_colors, instrumentation, **options)
+    # Only plain data goes back, so the job also works across processes
+    return result.grid_data, result.indices, result.cached, instrumentation.stages
+
+
+class AsyncConverter:
+    def __init__(self, max_workers=None, max_pending=None, processes=False, **options):
+        # max_pending bounds the jobs submitted to the executor, further callers wait their turn
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.processes = processes
+        self.options = options
+        self.executor = ProcessPoolExecutor(self.max_workers) if processes else ThreadPoolExecutor(self.max_workers)
+        self._slots = None
+
+    @property
+    def slots(self):
+        # Created on first use so it belongs to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def convert(self, source, preserve_colors=True, **options):
+        # Paths or encoded image bytes, file objects only work with threads
+        options = {**self.options, **options}
+        async with self.slots:
+            cancelled = None if self.processes else threading.Event()
+            job = self.executor.submit(_run_job, source, preserve_colors, options, cancelled)
+            future = asyncio.wrap_future(job)
+            try:
+                grid_data, indices, cached, stages = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Jobs that have not started are dropped, running thread jobs stop at their next stage.
+                # The slot is held until the job is really gone, so cancelling never overfills the executor
+                if cancelled is not None:
+                    cancelled.set()
+                if not job.cancel():
+                    await asyncio.wait([future])
+                    if not future.cancelled():
+                        future.exception()
+                raise
+
+        metrics = Instrumentation()
+        metrics.stages = stages
+        label = source if isinstance(source, (str, os.PathLike)) else None
+        return ConversionResult(shared_converter(**options), indices, grid_data, label, metrics, cached)
+
+    async def convert_many(self, sources, preserve_colors=True, **options):
+        return await asyncio.gather(*(self.convert(source, preserve_colors, **options) for source in sources))
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
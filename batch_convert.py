@@ -0,0 +1,154 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import Instrumentation
+from png_converter import create_converter
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+_worker_converter = None
+
+
+def is_image_file(path):
+    return os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def read_manifest(manifest_path):
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not os.path.isabs(line):
+                line = os.path.join(base_dir, line)
+            entries.append(line)
+    return entries
+
+
+def collect_inputs(specs):
+    # Specs can be image files, directories, glob patterns or @manifest files listing any of those
+    paths = []
+    seen = set()
+
+    def add(path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+
+    pending = list(specs)
+    while pending:
+        spec = pending.pop(0)
+        if spec.startswith("@"):
+            pending[0:0] = read_manifest(spec[1:])
+        elif os.path.isdir(spec):
+            for name in sorted(os.listdir(spec)):
+                path = os.path.join(spec, name)
+                if is_image_file(path):
+                    add(path)
+        elif glob.has_magic(spec):
+            for path in sorted(glob.glob(spec, recursive=True)):
+                if is_image_file(path):
+                    add(path)
+        elif os.path.isfile(spec):
+            add(spec)
+        else:
+            print(f"Skipping missing input: {spec}")
+
+    return paths
+
+
+def output_extension(encoding="text"):
+    return ".bin" if encoding == "binary" else ".txt"
+
+
+def plan_outputs(paths, output_dir=None, extension=".txt"):
+    # One output per source, next to it unless an output directory is given
+    jobs = []
+    used = set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        folder = output_dir if output_dir else os.path.dirname(path)
+        output_path = os.path.join(folder, stem + extension)
+        n = 1
+        while os.path.normcase(output_path) in used:
+            output_path = os.path.join(folder, f"{stem}_{n}{extension}")
+            n += 1
+        used.add(os.path.normcase(output_path))
+        jobs.append((path, output_path))
+    return jobs
+
+
+def _init_worker(converter_options):
+    global _worker_converter
+    _worker_converter = create_converter(verbose=False, **converter_options)
+
+
+def _convert_job(job):
+    png_path, output_path, preserve_colors, trace_memory, encoding = job
+    instrumentation = Instrumentation(trace_memory=trace_memory)
+    start = time.perf_counter()
+    try:
+        result = _worker_converter.convert(png_path, preserve_colors, instrumentation)
+        with instrumentation.stage("save"):
+            result.save(output_path, encoding)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return png_path, output_path, error, time.perf_counter() - start, instrumentation.summary()
+
+
+def run_batch(specs, output_dir=None, workers=None, preserve_colors=True, converter_options=None,
+              collect_metrics=False, trace_memory=False, encoding="text"):
+    converter_options = converter_options or {}
+    paths = collect_inputs(specs)
+    summary = {"total": len(paths), "converted": 0, "failed": 0, "elapsed": 0.0, "files_per_second": 0.0,
+               "metrics": []}
+
+    if not paths:
+        print("No input images found")
+        return summary
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [(png_path, output_path, preserve_colors, trace_memory, encoding)
+            for png_path, output_path in plan_outputs(paths, output_dir, output_extension(encoding))]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    print(f"Converting {len(jobs)} images with {workers} worker(s)")
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(converter_options)
+        results = map(_convert_job, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(converter_options,))
+        chunksize = max(1, len(jobs) // (workers * 8))
+        results = executor.map(_convert_job, jobs, chunksize=chunksize)
+
+    try:
+        for png_path, output_path, error, elapsed, metrics in results:
+            if collect_metrics:
+                summary["metrics"].append({"source": png_path, "output": output_path, "error": error, **metrics})
+            if error:
+                summary["failed"] += 1
+                print(f"FAILED {png_path}: {error}")
+            else:
+                summary["converted"] += 1
+                print(f"{png_path} -> {output_path} ({elapsed * 1000:.1f} ms)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    summary["elapsed"] = time.perf_counter() - start
+    if summary["elapsed"] > 0:
+        summary["files_per_second"] = summary["converted"] / summary["elapsed"]
+
+    print(f"\nConverted {summary['converted']}/{summary['total']} images in {summary['elapsed']:.2f}s "
+          f"({summary['files_per_second']:.1f} images/s), {summary['failed']} failed")
+    return summary
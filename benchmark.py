@@ -0,0 +1,577 @@
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_time_breakdown(module, runs=5, top=15):
+    # Each run is a fresh interpreter so nothing is already in sys.modules
+    wall_times = []
+    cumulative = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=SCRIPT_DIR, capture_output=True, text=True
+        )
+        wall_times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            fields = line[len("import time:"):].split("|")
+            cumulative.setdefault(fields[2].strip(), []).append(int(fields[1]))
+
+    slowest = sorted(
+        ((name, statistics.median(times) / 1000) for name, times in cumulative.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    return {
+        "module": module,
+        "runs": runs,
+        "wall_ms": statistics.median(wall_times) * 1000,
+        "import_ms": statistics.median(cumulative.get(module, [0])) / 1000,
+        "slowest_imports": [{"name": name, "cumulative_ms": ms} for name, ms in slowest],
+    }
+
+
+def bench_startup(args):
+    modules = ["png_converter", "converterGUI"]
+    runs = 5
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--runs":
+            runs = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        elif args[i] == "--module":
+            modules = [args[i + 1]]
+            i += 1
+        i += 1
+
+    baseline = time_interpreter(runs)
+    print(f"Bare interpreter start: {baseline:.1f} ms")
+
+    results = {"interpreter_ms": baseline, "modules": []}
+    for module in modules:
+        report = import_time_breakdown(module, runs)
+        results["modules"].append(report)
+        print(f"\n{module}: {report['wall_ms']:.1f} ms cold start, {report['import_ms']:.1f} ms importing")
+        for entry in report["slowest_imports"]:
+            print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['name']}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def time_interpreter(runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def make_large_image(path, size, kind):
+    from PIL import Image
+    import numpy as np
+
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[..., 0] = x
+    rgb[..., 1] = y
+    rgb[..., 2] = (x + y) / 2
+    image = Image.fromarray(rgb, "RGB")
+    del rgb
+
+    if kind == "palette":
+        image = image.quantize(64)
+    if path.endswith(".jpg"):
+        image.save(path, quality=90)
+    else:
+        image.save(path, compress_level=1)
+
+
+def memory_case(args):
+    # Runs in its own interpreter so ru_maxrss only reflects this one conversion
+    import resource
+    from PIL import Image
+    from png_converter import PixelGridConverter
+
+    path, mode = args
+    converter = PixelGridConverter(verbose=False, max_source_pixels=0)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "legacy":
+        # What load_png_image used to do: full decode plus a full size RGBA copy
+        image = Image.open(path).convert("RGBA")
+        converter.quantize_to_indices(converter.resize_image_to_grid(image))
+    else:
+        converter.convert(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    print(json.dumps({"peak_mb": peak / scale, "delta_mb": (peak - before) / scale, "seconds": elapsed}))
+
+
+def bench_memory(args):
+    import tempfile
+
+    sizes = [4000, 8000]
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--sizes":
+            sizes = [int(size) for size in args[i + 1].split(",")]
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        i += 1
+
+    if importlib.util.find_spec("resource") is None:
+        print("The memory benchmark needs the resource module (Linux/macOS)")
+        sys.exit(1)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            for kind, ext in (("rgb", ".png"), ("palette", ".png"), ("rgb", ".jpg")):
+                path = os.path.join(tmp_dir, f"{kind}_{size}{ext}")
+                # Generated in a child as well, Linux carries ru_maxrss across fork/exec
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "_make_image", path, str(size), kind],
+                    cwd=SCRIPT_DIR, check=True
+                )
+                for mode in ("legacy", "current"):
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "_memory_case", path, mode],
+                        cwd=SCRIPT_DIR, capture_output=True, text=True
+                    )
+                    if proc.returncode != 0:
+                        raise RuntimeError(f"Memory case failed:\n{proc.stderr}")
+                    case = json.loads(proc.stdout.strip().splitlines()[-1])
+                    case.update({"size": size, "source": os.path.basename(path), "mode": mode})
+                    results.append(case)
+                    print(f"{case['source']:>18} {mode:>8}: +{case['delta_mb']:7.1f} MB peak, {case['seconds'] * 1000:8.1f} ms")
+                os.remove(path)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def time_call(func, repeat):
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def gradient_image(width, height):
+    from PIL import Image
+    import numpy as np
+
+    x = np.linspace(0, 255, width)
+    y = np.linspace(0, 255, height)[:, None]
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[..., 0] = x
+    rgb[..., 1] = y
+    rgb[..., 2] = 255 - (x + y) / 2
+    return Image.fromarray(rgb, "RGB").convert("RGBA")
+
+
+def bench_dither(args):
+    from png_converter import PixelGridConverter
+    from dithering import DITHER_METHODS, DITHER_SPACES
+
+    grids = [(100, 66), (200, 132), (400, 264)]
+    repeat = 20
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--repeat":
+            repeat = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        i += 1
+
+    results = []
+    for width, height in grids:
+        image = gradient_image(width, height)
+        print(f"\n{width}x{height} grid")
+        for method in DITHER_METHODS:
+            for space in (DITHER_SPACES if method != "none" else ["-"]):
+                converter = PixelGridConverter(grid_width=width, grid_height=height, verbose=False,
+                                               dither=method, dither_space=space if method != "none" else "linear")
+                ms = time_call(lambda: converter.quantize_to_indices(image), repeat)
+                results.append({"grid": [width, height], "method": method, "space": space, "ms": ms})
+                print(f"  {method:>16} {space:>6}: {ms:8.2f} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def full_kmeans(pixels, n_clusters, iterations=10):
+    # Plain Lloyd iterations over every source pixel, what --use-clustering would cost without sampling
+    import numpy as np
+    from clustering import init_centers
+    from dithering import nearest_indices
+
+    rng = np.random.default_rng(0)
+    centers = init_centers(pixels[rng.integers(len(pixels), size=min(len(pixels), 20_000))], n_clusters, rng)
+    for _ in range(iterations):
+        labels = nearest_indices(pixels, centers)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        seen = counts > 0
+        centers[seen] = sums[seen] / counts[seen, None]
+    return centers
+
+
+def bench_clustering(args):
+    import numpy as np
+    from png_converter import CLUSTERS, PixelGridConverter
+
+    sizes = [(640, 480), (2048, 1536)]
+    repeat = 5
+    clusters = CLUSTERS
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--repeat":
+            repeat = int(args[i + 1])
+            i += 1
+        elif args[i] == "--clusters":
+            clusters = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        i += 1
+
+    converter = PixelGridConverter(verbose=False, clusters=clusters)
+    results = []
+    for width, height in sizes:
+        for kind in ("gradient", "noise"):
+            image = synthetic_image(kind, width, height).convert("RGB")
+            resized = converter.resize_image_to_grid(image)
+            pixels = np.asarray(image, dtype=np.float32).reshape(-1, 3)
+            timings = {
+                "default": time_call(lambda: converter.quantize_to_indices(resized), repeat),
+                "clustering": time_call(lambda: converter.cluster_to_indices(image, resized), repeat),
+                "full_kmeans": time_call(lambda: full_kmeans(pixels, clusters), 1),
+            }
+            colors = len(np.unique(converter.cluster_to_indices(image, resized)))
+            results.append({"size": [width, height], "kind": kind, "clusters": clusters, "colors": colors, **timings})
+            print(f"{width}x{height} {kind:>8}: default {timings['default']:8.2f} ms, "
+                  f"clustering {timings['clustering']:8.2f} ms ({colors} colors), "
+                  f"full-image k-means {timings['full_kmeans']:9.2f} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def bench_resample(args):
+    from png_converter import PixelGridConverter
+    from resampling import RESAMPLE_METHODS, row_blocks, weight_matrix
+
+    sizes = [(640, 480), (2048, 1536)]
+    repeat = 10
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--repeat":
+            repeat = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        i += 1
+
+    results = []
+    for width, height in sizes:
+        for kind in ("gradient", "noise", "alpha"):
+            image = synthetic_image(kind, width, height)
+            print(f"\n{width}x{height} {kind}")
+            for method in RESAMPLE_METHODS:
+                converter = PixelGridConverter(verbose=False, resample=method)
+                # First call of a source size builds the weights, later ones reuse them
+                weight_matrix.cache_clear()
+                row_blocks.cache_clear()
+                start = time.perf_counter()
+                converter.resize_image_to_grid(image)
+                first_ms = (time.perf_counter() - start) * 1000
+                ms = time_call(lambda: converter.resize_image_to_grid(image), repeat)
+                results.append({"size": [width, height], "kind": kind, "method": method, "first_ms": first_ms, "ms": ms})
+                print(f"  {method:>8}: {ms:8.2f} ms (first call {first_ms:8.2f} ms)")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def bench_registry(args):
+    import tempfile
+    from registry_backend import REG_BINARY, REG_SZ, FileBackend, RegistryIndex
+
+    companies = 40
+    products = 10
+    repeat = 20
+    output = None
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--companies":
+            companies = int(args[i + 1])
+            i += 1
+        elif args[i] == "--repeat":
+            repeat = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        i += 1
+
+    with tempfile.TemporaryDirectory() as folder:
+        backend = FileBackend(os.path.join(folder, "registry.json"))
+        for c in range(companies):
+            for p in range(products):
+                backend.set_value(f"SOFTWARE\\company{c}\\product{p}", "setting", "1", REG_SZ)
+        flag_path = r"SOFTWARE\jrsjams\MageArena"
+        grid = b"0.0:0.9," * 6599 + b"0.0:0.9\0"
+        backend.set_value(flag_path, "flagGrid_h3042110417", grid, REG_BINARY)
+
+        index = RegistryIndex(backend)
+        results = {
+            "cold_scan": time_call(lambda: RegistryIndex(backend).unity_paths(), repeat),
+            "indexed_scan": time_call(index.unity_paths, repeat),
+            "unchanged_write": time_call(lambda: index.write_value(flag_path, "flagGrid_h3042110417", grid, REG_BINARY),
+                                         repeat),
+        }
+        counter = iter(range(10 ** 9))
+        results["changed_write"] = time_call(
+            lambda: index.write_value(flag_path, "flagGrid_h3042110417", grid + str(next(counter)).encode(), REG_BINARY),
+            repeat)
+
+    print(f"{companies * products} product keys")
+    for name, ms in results.items():
+        print(f"  {name:>16}: {ms:8.3f} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+def synthetic_image(kind, width, height, seed=0):
+    from PIL import Image
+    import numpy as np
+
+    if kind == "flat":
+        return Image.new("RGB", (width, height), (70, 110, 200))
+    if kind == "noise":
+        rng = np.random.default_rng(seed)
+        return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), "RGB")
+
+    image = gradient_image(width, height)
+    if kind == "alpha":
+        alpha = np.linspace(0, 255, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+        image.putalpha(Image.fromarray(alpha.astype(np.uint8), "L"))
+    return image
+
+
+STAGE_IMAGE_KINDS = ("flat", "gradient", "noise", "alpha")
+STAGE_IMAGE_SIZES = ((100, 66), (640, 480), (2048, 1536))
+
+
+def stage_timings(converter, path, output_path, repeat):
+    from png_converter import ConversionResult
+
+    stages = {}
+
+    def record(name, func):
+        times = []
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+        stages[name] = {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000}
+        return result
+
+    image = record("load_png_image", lambda: converter.load_png_image(path))
+    resized = record("resize_image_to_grid", lambda: converter.resize_image_to_grid(image))
+    # The same calls convert() and ConversionResult.save() make, so the gate measures what actually runs
+    indices = record("quantize_to_indices", lambda: converter.quantize_to_indices(resized))
+    grid_data = record("serialize_indices", lambda: converter.serialize_indices(indices).decode("utf-8"))
+    record("save", lambda: ConversionResult(converter, indices, grid_data).save(output_path))
+    record("total", lambda: converter.convert(path).save(output_path))
+    return stages
+
+
+def compare_to_baseline(results, baseline, threshold, noise_floor_ms=0.05):
+    # Compares best-of-N times, they are far less noisy than medians on a busy machine
+    previous = {(entry["image"], entry["stage"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry["image"], entry["stage"]))
+        if old is None:
+            continue
+        entry["baseline_ms"] = old["min_ms"]
+        entry["ratio"] = entry["min_ms"] / old["min_ms"] if old["min_ms"] else float("inf")
+        if entry["ratio"] > 1 + threshold and entry["min_ms"] - old["min_ms"] > noise_floor_ms:
+            regressions.append(entry)
+    return regressions
+
+
+def bench_stages(args):
+    import platform
+    import tempfile
+
+    import numpy as np
+    import PIL
+    from png_converter import PixelGridConverter
+
+    repeat = 15
+    output = None
+    baseline_path = None
+    threshold = 0.25
+    sizes = STAGE_IMAGE_SIZES
+
+    i = 0
+    while i < len(args):
+        if args[i] == "--repeat":
+            repeat = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json":
+            output = args[i + 1]
+            i += 1
+        elif args[i] == "--baseline":
+            baseline_path = args[i + 1]
+            i += 1
+        elif args[i] == "--threshold":
+            threshold = float(args[i + 1])
+            i += 1
+        elif args[i] == "--sizes":
+            sizes = [tuple(int(n) for n in size.split("x")) for size in args[i + 1].split(",")]
+            i += 1
+        i += 1
+
+    converter = PixelGridConverter(verbose=False)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "grid.txt")
+        for width, height in sizes:
+            for kind in STAGE_IMAGE_KINDS:
+                name = f"{kind}_{width}x{height}"
+                path = os.path.join(tmp_dir, f"{name}.png")
+                synthetic_image(kind, width, height).save(path)
+
+                print(f"\n{name}")
+                for stage, timing in stage_timings(converter, path, output_path, repeat).items():
+                    results.append({"image": name, "stage": stage, **timing})
+                    print(f"  {stage:>26}: {timing['median_ms']:8.3f} ms (min {timing['min_ms']:.3f})")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare_to_baseline(results, json.load(f), threshold)
+        print(f"\nCompared against {baseline_path} (threshold +{threshold:.0%})")
+        for entry in regressions:
+            print(f"  REGRESSION {entry['image']} {entry['stage']}: "
+                  f"{entry['baseline_ms']:.3f} -> {entry['min_ms']:.3f} ms ({entry['ratio']:.2f}x)")
+        if not regressions:
+            print("  No regressions")
+        report["regressions"] = [(entry["image"], entry["stage"]) for entry in regressions]
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+    if regressions:
+        sys.exit(1)
+    return report
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "memory": bench_memory,
+    "dither": bench_dither,
+    "stages": bench_stages,
+    "clustering": bench_clustering,
+    "registry": bench_registry,
+    "resample": bench_resample,
+    "_memory_case": memory_case,
+    "_make_image": lambda args: make_large_image(args[0], (int(args[1]), int(args[1])), args[2]),
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: python benchmark.py <{'|'.join(name for name in BENCHMARKS if not name.startswith('_'))}> [options]")
+        print("       python benchmark.py startup [--runs N] [--module NAME] [--json FILE]")
+        print("       python benchmark.py memory [--sizes 4000,8000] [--json FILE]")
+        print("       python benchmark.py dither [--repeat N] [--json FILE]")
+        print("       python benchmark.py clustering [--repeat N] [--clusters N] [--json FILE]")
+        print("       python benchmark.py resample [--repeat N] [--json FILE]")
+        print("       python benchmark.py registry [--companies N] [--repeat N] [--json FILE]")
+        print("       python benchmark.py stages [--repeat N] [--sizes 100x66,640x480] [--json FILE]")
+        print("                                  [--baseline FILE] [--threshold 0.25]")
+        sys.exit(1)
+
+    BENCHMARKS[sys.argv[1]](sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+from PIL import Image
+
+from dithering import nearest_indices
+
+# How many source pixels k-means looks at, however large the image is
+MAX_SAMPLES = 20_000
+BATCH_SIZE = 1024
+ITERATIONS = 60
+INIT_SAMPLES = 4096
+
+
+def sample_pixels(image, max_samples=MAX_SAMPLES):
+    # A nearest-neighbour downscale is an evenly spread subsample that keeps the real source colors
+    width, height = image.size
+    if width * height > max_samples:
+        scale = (width * height / max_samples) ** 0.5
+        image = image.resize((max(1, int(width / scale)), max(1, int(height / scale))), Image.NEAREST)
+    return np.asarray(image.convert("RGB"), dtype=np.float32).reshape(-1, 3)
+
+
+def init_centers(pixels, n_clusters, rng):
+    # k-means++ seeding, each new center drawn in proportion to its squared distance from the chosen ones
+    centers = [pixels[rng.integers(len(pixels))]]
+    distance = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, n_clusters):
+        cumulative = np.cumsum(distance)
+        if cumulative[-1] <= 0:
+            break
+        center = pixels[min(np.searchsorted(cumulative, rng.random() * cumulative[-1]), len(pixels) - 1)]
+        centers.append(center)
+        np.minimum(distance, ((pixels - center) ** 2).sum(axis=1), out=distance)
+    return np.array(centers)
+
+
+def minibatch_kmeans(pixels, n_clusters, batch_size=BATCH_SIZE, iterations=ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, len(pixels)))
+    centers = init_centers(pixels[rng.integers(len(pixels), size=min(len(pixels), INIT_SAMPLES))], n_clusters, rng)
+    counts = np.zeros(len(centers))
+
+    for _ in range(iterations):
+        batch = pixels[rng.integers(len(pixels), size=min(batch_size, len(pixels)))]
+        labels = nearest_indices(batch, centers)
+        batch_counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=batch[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+
+        # Per-center learning rate of 1 / (points seen), the same as averaging every batch so far
+        counts += batch_counts
+        seen = batch_counts > 0
+        centers[seen] += (sums[seen] - batch_counts[seen, None] * centers[seen]) / counts[seen, None]
+
+    return centers
+
+
+def cluster_table(centers, palette_rgb, nearest_palette=None):
+    # Cluster -> palette index, snapping every center to its closest game color
+    if nearest_palette is not None:
+        return nearest_palette(np.clip(np.rint(centers), 0, 255).astype(np.uint8)[None]).ravel()
+    return nearest_indices(centers, palette_rgb.astype(np.float32))
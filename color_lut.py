@@ -0,0 +1,203 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+LUT_VERSION = 1
+LUT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS = ("lab", "ciede2000")
+
+# sRGB (D65) -> XYZ
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+_loaded_luts = {}
+_loaded_luts_lock = threading.Lock()
+
+
+def srgb_to_linear(rgb):
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_lab(linear):
+    xyz = (linear @ _RGB_TO_XYZ.T) / _WHITE_D65
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta ** 2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def rgb_to_lab(rgb):
+    return linear_to_lab(srgb_to_linear(rgb))
+
+
+def delta_e76(lab1, lab2):
+    return np.sqrt(((lab1 - lab2) ** 2).sum(axis=-1))
+
+
+def delta_e2000(lab1, lab2):
+    # Vectorized CIEDE2000 (Sharma, Wu & Dalal 2005), broadcasting over leading axes
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    c_bar7 = c_bar ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + 25.0 ** 7)))
+    a1p = (1 + g) * a1
+    a2p = (1 + g) * a2
+    c1p = np.hypot(a1p, b1)
+    c2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (c1p * c2p) == 0
+
+    dlp = L2 - L1
+    dcp = c2p - c1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, dhp)
+    dhp = np.where(dhp < -180, dhp + 360, dhp)
+    dhp = np.where(chroma_zero, 0, dhp)
+    d_hp = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dhp / 2))
+
+    l_barp = (L1 + L2) / 2
+    c_barp = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_barp = np.where(np.abs(h1p - h2p) > 180, np.where(h_sum < 360, h_sum + 360, h_sum - 360), h_sum) / 2
+    h_barp = np.where(chroma_zero, h_sum, h_barp)
+
+    t = (1 - 0.17 * np.cos(np.radians(h_barp - 30)) + 0.24 * np.cos(np.radians(2 * h_barp))
+         + 0.32 * np.cos(np.radians(3 * h_barp + 6)) - 0.20 * np.cos(np.radians(4 * h_barp - 63)))
+    d_theta = 30 * np.exp(-(((h_barp - 275) / 25) ** 2))
+    c_barp7 = c_barp ** 7
+    r_c = 2 * np.sqrt(c_barp7 / (c_barp7 + 25.0 ** 7))
+    l50 = (l_barp - 50) ** 2
+    s_l = 1 + 0.015 * l50 / np.sqrt(20 + l50)
+    s_c = 1 + 0.045 * c_barp
+    s_h = 1 + 0.015 * c_barp * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    return np.sqrt((dlp / s_l) ** 2 + (dcp / s_c) ** 2 + (d_hp / s_h) ** 2 + r_t * (dcp / s_c) * (d_hp / s_h))
+
+
+def nearest_palette_indices(lab, palette_lab, metric="lab"):
+    distance = delta_e2000 if metric == "ciede2000" else delta_e76
+    return distance(lab[:, None, :], palette_lab[None, :, :]).argmin(axis=1).astype(np.uint8)
+
+
+class PaletteLUT:
+    def __init__(self, palette_rgb, metric="lab", bits=5, cache_dir=LUT_DIR, palette_name="palette"):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown color metric '{metric}', expected one of {', '.join(METRICS)}")
+        if not 1 <= bits <= 8:
+            raise ValueError(f"LUT bits must be between 1 and 8, got {bits}")
+
+        self.palette_rgb = np.asarray(palette_rgb, dtype=np.uint8)
+        self.metric = metric
+        self.bits = bits
+        self.cache_dir = cache_dir
+        # Part of the file name, so tables for other palettes are never taken for stale ones
+        self.palette_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in palette_name)
+        self.table = None
+
+    def digest(self):
+        h = hashlib.sha1()
+        h.update(f"{LUT_VERSION}:{self.metric}:{self.bits}:".encode())
+        h.update(self.palette_rgb.tobytes())
+        return h.hexdigest()[:16]
+
+    def file_prefix(self):
+        return f"palette_lut_{self.palette_name}_{self.metric}_{self.bits}bit_"
+
+    def path(self):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{self.file_prefix()}{self.digest()}.npy")
+
+    def load(self):
+        path = self.path()
+        if path and os.path.exists(path):
+            try:
+                table = np.load(path, mmap_mode='r')
+                if table.dtype == np.uint8 and table.shape == (1 << (3 * self.bits),):
+                    self.table = table
+                    return self.table
+            except (OSError, ValueError):
+                pass
+
+        self.table = self.build()
+        self.save()
+        return self.table
+
+    def build(self):
+        levels = 1 << self.bits
+        step = 256 // levels
+        # Match against the center of every quantized RGB cell
+        values = np.arange(levels) * step + (step - 1) / 2
+        palette_lab = rgb_to_lab(self.palette_rgb)
+
+        table = np.empty(levels ** 3, dtype=np.uint8)
+        chunk = 1 << 15
+        codes = np.arange(levels ** 3)
+        for start in range(0, len(codes), chunk):
+            part = codes[start:start + chunk]
+            rgb = np.stack([
+                values[part >> (2 * self.bits)],
+                values[(part >> self.bits) & (levels - 1)],
+                values[part & (levels - 1)],
+            ], axis=-1)
+            table[start:start + chunk] = nearest_palette_indices(rgb_to_lab(rgb), palette_lab, self.metric)
+        return table
+
+    def save(self):
+        path = self.path()
+        if not path:
+            return False
+
+        try:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self.table)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Read-only install, keep the table in memory only
+            return False
+
+        # Tables built for an older version of this palette are no longer valid
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(self.file_prefix()) and name.endswith(".npy") and os.path.join(self.cache_dir, name) != path:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return True
+
+    def lookup(self, rgb):
+        if self.table is None:
+            self.load()
+
+        rgb = np.asarray(rgb)
+        shift = 8 - self.bits
+        codes = (rgb[..., 0].astype(np.intp) >> shift) << (2 * self.bits)
+        codes |= (rgb[..., 1].astype(np.intp) >> shift) << self.bits
+        codes |= rgb[..., 2].astype(np.intp) >> shift
+        return self.table[codes]
+
+
+def get_lut(palette_rgb, metric="lab", bits=5, cache_dir=LUT_DIR, palette_name="palette"):
+    lut = PaletteLUT(palette_rgb, metric, bits, cache_dir, palette_name)
+    key = (lut.digest(), cache_dir)
+    # Held while loading, so threads asking for the same table wait for one build instead of each doing it
+    with _loaded_luts_lock:
+        if key not in _loaded_luts:
+            lut.load()
+            _loaded_luts[key] = lut
+        return _loaded_luts[key]
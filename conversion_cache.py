@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_VERSION = 1
+# Eviction goes down to this share of the cap, so the folder isn't rescanned again on the next write
+EVICT_TO = 0.9
+
+
+class ConversionCache:
+    def __init__(self, max_entries=64, disk_dir=None, disk_max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bytes in disk_dir as of the last scan plus what this cache wrote since, None before the first scan
+        self.disk_bytes = None
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(source_bytes, settings):
+        h = hashlib.sha256()
+        h.update(f"{CACHE_VERSION}:{settings!r}:".encode())
+        h.update(source_bytes)
+        return h.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, grid_data, indices):
+        indices = np.array(indices, dtype=np.uint8)
+        indices.flags.writeable = False
+        entry = (grid_data, indices)
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                grid_data = data["grid"].tobytes().decode("utf-8")
+                indices = data["indices"]
+            # Bump the mtime so eviction drops the least recently used files first
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        indices.flags.writeable = False
+        return grid_data, indices
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+
+        grid_data, indices = entry
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, grid=np.frombuffer(grid_data.encode("utf-8"), dtype=np.uint8), indices=indices)
+                size = f.tell()
+            try:
+                size -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write conversion cache entry: {e}")
+            return
+
+        # The folder is only scanned when the running total says it is over the cap. Other processes
+        # sharing it are not counted until then, the scan itself sees everything
+        with self.lock:
+            if self.disk_bytes is not None:
+                self.disk_bytes += size
+            over = self.disk_bytes is None or self.disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        files.sort()
+        target = self.disk_max_bytes if total <= self.disk_max_bytes else self.disk_max_bytes * EVICT_TO
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self.lock:
+            self.disk_bytes = total
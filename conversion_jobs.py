@@ -0,0 +1,125 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import ConversionCancelled, Instrumentation, cancel_hook
+from png_converter import convert_source
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class ConversionJob:
+    def __init__(self, job_id, path, preserve_colors=True, options=None, after=None):
+        self.id = job_id
+        self.path = path
+        self.preserve_colors = preserve_colors
+        self.options = options or {}
+        # Runs on the worker after a successful conversion, may return a message to log
+        self.after = after
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.elapsed_ms = None
+        self.cancelled = threading.Event()
+        self.future = None
+
+
+class JobQueue:
+    # Workers never touch Tk: everything they report goes into one queue the GUI polls
+    def __init__(self, workers=None, cache=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                           thread_name_prefix="convert")
+        self.events = queue.Queue()
+        self.jobs = {}
+        self.cache = cache
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, path, preserve_colors=True, options=None, after=None):
+        job = ConversionJob(next(self._ids), path, preserve_colors, options, after)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.events.put(("status", job, QUEUED))
+        job.future = self.executor.submit(self._run, job)
+        return job
+
+    def post(self, kind, job, detail):
+        # For other worker threads that report to the GUI, such as the live preview
+        self.events.put((kind, job, detail))
+
+    def _set_status(self, job, status):
+        job.status = status
+        self.events.put(("status", job, status))
+
+    def _log_stage(self, job, event):
+        if event["event"] == "stage_end":
+            self.events.put(("log", job, f"  {os.path.basename(job.path)} {event['stage']}: {event['wall_ms']:.1f} ms"))
+
+    def _run(self, job):
+        if job.cancelled.is_set():
+            self._set_status(job, CANCELLED)
+            return
+        self._set_status(job, RUNNING)
+        instrumentation = Instrumentation(hooks=[cancel_hook(job.cancelled), lambda event: self._log_stage(job, event)])
+        start = time.perf_counter()
+        try:
+            job.result = convert_source(job.path, job.preserve_colors, instrumentation, cache=self.cache, **job.options)
+            if job.after is not None:
+                message = job.after(job)
+                if message:
+                    self.events.put(("log", job, message))
+            status = DONE
+        except ConversionCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        job.elapsed_ms = (time.perf_counter() - start) * 1000
+        self._set_status(job, status)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return
+        job.cancelled.set()
+        # Queued jobs go straight away, running ones stop at their next stage
+        if job.future is not None and job.future.cancel():
+            self._set_status(job, CANCELLED)
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def forget_finished(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+            for job_id in finished:
+                del self.jobs[job_id]
+        return finished
+
+    def poll(self, limit=500):
+        events = []
+        try:
+            while len(events) < limit:
+                events.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    def counts(self):
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        for job in list(self.jobs.values()):
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
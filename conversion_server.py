@@ -0,0 +1,286 @@
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from conversion_cache import ConversionCache
+from instrumentation import Instrumentation
+from palette import available_palettes
+from png_converter import PixelGridConverter
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_REQUEST_BYTES = 32 * 1024 * 1024
+# Distinct converter settings kept warm, the least recently used set is dropped past this
+MAX_CONVERTERS = 16
+
+# Query parameters that pick converter settings, with how to parse each
+CONVERTER_OPTIONS = {
+    "color_mode": str,
+    "lut_bits": int,
+    "dither": str,
+    "dither_space": str,
+    "clusters": int,
+    "resample": str,
+    "palette": str,
+}
+
+
+class ConversionService:
+    def __init__(self, max_concurrent=None, max_request_bytes=MAX_REQUEST_BYTES, cache_entries=256):
+        self.max_concurrent = max_concurrent or os.cpu_count() or 1
+        self.max_request_bytes = max_request_bytes
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.cache = ConversionCache(max_entries=cache_entries)
+        self.converters = OrderedDict()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stats = {"requests": 0, "converted": 0, "failed": 0, "rejected": 0, "in_flight": 0, "total_ms": 0.0}
+
+    def converter(self, options):
+        # One warmed converter per distinct settings, shared by every request that uses them. The
+        # constructor checks every option, so settings that fail it are never kept
+        key = tuple(sorted(options.items()))
+        with self.lock:
+            converter = self.converters.get(key)
+            if converter is None:
+                converter = PixelGridConverter(verbose=False, cache=self.cache, **options)
+                self.converters[key] = converter
+                while len(self.converters) > MAX_CONVERTERS:
+                    self.converters.popitem(last=False)
+            self.converters.move_to_end(key)
+            return converter
+
+    def warm_up(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buffer, "PNG")
+        self.converter({}).convert(buffer.getvalue()).grid_data
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def convert(self, data, query):
+        options = {}
+        try:
+            for name, parse in CONVERTER_OPTIONS.items():
+                if name in query:
+                    options[name] = parse(query[name][-1])
+            # Only palettes shipped in palettes/, a client must not make the server open other files
+            if "palette" in options and options["palette"] not in available_palettes():
+                raise ValueError(f"Unknown palette '{options['palette']}', expected one of "
+                                 f"{', '.join(available_palettes())}")
+            encoding = query.get("encoding", ["text"])[-1]
+            if encoding not in ("text", "binary"):
+                raise ValueError(f"Unknown encoding '{encoding}', expected text or binary")
+            preserve_colors = query.get("clustering", ["0"])[-1] not in ("1", "true", "yes")
+            converter = self.converter(options)
+        except ValueError as e:
+            self.count("failed")
+            return 400, {}, str(e).encode()
+
+        instrumentation = Instrumentation()
+        start = time.perf_counter()
+        try:
+            result = converter.convert(data, preserve_colors, instrumentation)
+            payload = bytes(result.grid_bytes(encoding))
+        except ValueError as e:
+            self.count("failed")
+            return 400, {}, str(e).encode()
+        except Exception as e:
+            self.count("failed")
+            return 500, {}, f"Conversion failed: {e}".encode()
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.stats["converted"] += 1
+            self.stats["total_ms"] += elapsed
+        headers = {
+            "Content-Type": "application/octet-stream" if encoding == "binary" else "text/plain; charset=utf-8",
+            "X-Conversion-Ms": f"{elapsed:.2f}",
+            "X-Cached": "1" if result.cached else "0",
+            "X-Grid-Size": f"{result.width}x{result.height}",
+        }
+        return 200, headers, payload
+
+    def health(self):
+        with self.lock:
+            stats = dict(self.stats)
+            converters = len(self.converters)
+        total_ms = stats.pop("total_ms")
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started, 1),
+            "max_concurrent": self.max_concurrent,
+            **stats,
+            "average_ms": round(total_ms / stats["converted"], 3) if stats["converted"] else None,
+            "converters": converters,
+            "cache": {"entries": len(self.cache.entries), "hits": self.cache.hits, "misses": self.cache.misses},
+        }
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client can push many jobs over one connection
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def respond(self, status, headers, payload):
+        self.send_response(status)
+        headers = {"Content-Type": "text/plain; charset=utf-8", **headers}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self.respond(404, {}, b"Not found")
+            return
+        body = json.dumps(self.server.service.health(), indent=2).encode()
+        self.respond(200, {"Content-Type": "application/json"}, body)
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        service.count("requests")
+        if url.path != "/convert":
+            self.close_connection = True
+            self.respond(404, {}, b"Not found")
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self.respond(411, {}, b"Content-Length required")
+            return
+        length = int(length)
+        if length > service.max_request_bytes:
+            self.close_connection = True
+            self.respond(413, {}, f"Image is over the {service.max_request_bytes} byte limit".encode())
+            return
+
+        # The body is read even when busy, so the client sees the 503 instead of a broken pipe
+        data = self.rfile.read(length)
+
+        # Busy servers answer straight away instead of queueing without bound
+        if not service.slots.acquire(blocking=False):
+            service.count("rejected")
+            self.respond(503, {"Retry-After": "1"}, b"Server busy")
+            return
+
+        service.count("in_flight")
+        try:
+            status, headers, payload = service.convert(data, parse_qs(url.query))
+        finally:
+            service.count("in_flight", -1)
+            service.slots.release()
+        self.respond(status, headers, payload)
+
+
+class ConversionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, ConversionHandler)
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class ConversionUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path, service, verbose=False):
+            self.service = service
+            self.verbose = verbose
+            super().__init__(path, ConversionHandler)
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, verbose=False):
+    if socket_path:
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise ValueError("Unix sockets are not supported on this platform")
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ConversionUnixServer(socket_path, service, verbose)
+    return ConversionHTTPServer((host, port), service, verbose)
+
+
+def serve_main(args):
+    host = DEFAULT_HOST
+    port = DEFAULT_PORT
+    socket_path = None
+    max_concurrent = None
+    max_request_bytes = MAX_REQUEST_BYTES
+    verbose = True
+
+    i = 0
+    try:
+        while i < len(args):
+            arg = args[i]
+            if arg == "--host":
+                host = args[i + 1]
+                i += 1
+            elif arg == "--port":
+                port = int(args[i + 1])
+                i += 1
+            elif arg == "--socket":
+                socket_path = args[i + 1]
+                i += 1
+            elif arg == "--max-concurrent":
+                max_concurrent = int(args[i + 1])
+                i += 1
+            elif arg == "--max-mb":
+                max_request_bytes = int(float(args[i + 1]) * 1024 * 1024)
+                i += 1
+            elif arg == "--quiet":
+                verbose = False
+            else:
+                print(f"Unknown server option: {arg}")
+                return 1
+            i += 1
+    except (IndexError, ValueError):
+        print(f"Missing or invalid value for {args[i]}")
+        return 1
+
+    service = ConversionService(max_concurrent, max_request_bytes)
+    service.warm_up()
+    try:
+        server = create_server(service, host, port, socket_path, verbose)
+    except (OSError, ValueError) as e:
+        print(f"Failed to start server: {e}")
+        return 1
+
+    where = socket_path if socket_path else f"http://{host}:{server.server_address[1]}"
+    print(f"Serving conversions on {where} (max {service.max_concurrent} at once)")
+    print("POST /convert with the image as the body, GET /health for metrics. Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve_main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+import io
+import os
+import threading
+
+from instrumentation import Instrumentation
+from png_converter import ConversionResult
+
+# In pipeline order, a stage is only rebuilt when its key or the key of a stage before it changes
+STAGES = ("load", "resize", "color_space", "quantize")
+
+
+class ConversionSession:
+    def __init__(self, converter):
+        self.converter = converter
+        self.keys = {}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def stage_keys(self, png_path, preserve_colors):
+        converter = self.converter
+        stat = os.stat(png_path)
+        load = (os.path.abspath(png_path), stat.st_mtime_ns, stat.st_size,
+                converter.max_source_pixels, converter.working_pixels, converter.cache is not None)
+        resize = (converter.grid_width, converter.grid_height, converter.resample)
+        color_space = (converter.quantize_space(),)
+        quantize = converter.settings_key(preserve_colors)
+        return dict(zip(STAGES, (load, resize, color_space, quantize)))
+
+    def invalidate(self, stage="load"):
+        # Drops the stage and everything after it
+        for name in STAGES[STAGES.index(stage):]:
+            self.keys.pop(name, None)
+            self.values.pop(name, None)
+
+    def convert(self, png_path, preserve_colors=True, instrumentation=None, **options):
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        if not os.path.exists(png_path):
+            raise FileNotFoundError(f"PNG file not found: {png_path}")
+
+        with self.lock:
+            converter = self.converter
+            converter.configure(**options)
+
+            keys = self.stage_keys(png_path, preserve_colors)
+            for stage in STAGES:
+                if self.keys.get(stage) != keys[stage]:
+                    self.invalidate(stage)
+                    break
+            reused = [stage for stage in STAGES if stage in self.values]
+            if reused:
+                instrumentation.message(f"Reusing stages: {', '.join(reused)}")
+
+            if "load" not in self.values:
+                with instrumentation.stage("load", f"Loading PNG image: {png_path}"):
+                    source_bytes = None
+                    source = png_path
+                    if converter.cache is not None:
+                        with open(png_path, 'rb') as f:
+                            source_bytes = f.read()
+                        source = io.BytesIO(source_bytes)
+                    self.store("load", keys, (converter.load_png_image(source), source_bytes))
+            image, source_bytes = self.values["load"]
+
+            if "resize" not in self.values:
+                with instrumentation.stage("resize", f"Resizing image to {converter.grid_width}x{converter.grid_height}"):
+                    self.store("resize", keys, converter.resize_image_to_grid(image))
+            resized_image = self.values["resize"]
+
+            if "color_space" not in self.values:
+                with instrumentation.stage("color_space", space=keys["color_space"][0]):
+                    self.store("color_space", keys, converter.to_quantize_space(resized_image))
+            pixels = self.values["color_space"]
+
+            if "quantize" not in self.values:
+                cache_key = None
+                cached = None
+                if source_bytes is not None:
+                    with instrumentation.stage("cache_lookup"):
+                        cache_key = converter.cache.make_key(source_bytes, keys["quantize"])
+                        cached = converter.cache.get(cache_key)
+
+                if cached is not None:
+                    self.store("quantize", keys, cached + (True,))
+                else:
+                    with instrumentation.stage("quantize", "Converting to UV coordinates"):
+                        if preserve_colors:
+                            indices = converter.quantize_to_indices(resized_image, pixels)
+                        else:
+                            indices = converter.cluster_to_indices(image, resized_image, pixels)
+                    indices.flags.writeable = False
+                    grid_data = None
+                    if cache_key is not None:
+                        grid_data = converter.serialize_indices(indices).decode("utf-8")
+                        converter.cache.put(cache_key, grid_data, indices)
+                    self.store("quantize", keys, (grid_data, indices, False))
+            grid_data, indices, cached = self.values["quantize"]
+
+        return ConversionResult(converter, indices, grid_data, png_path, instrumentation, cached)
+
+    def store(self, stage, keys, value):
+        self.keys[stage] = keys[stage]
+        self.values[stage] = value
@@ -1,9 +1,14 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, scrolledtext
 import os
 import threading
-from PIL import Image, ImageTk
-from png_converter import PixelGridConverter
+from PIL import ImageTk
+from instrumentation import Instrumentation
+
+try:
+    from tkinterdnd2 import TkinterDnD, DND_FILES
+except ImportError:
+    TkinterDnD = None
 
 class ConverterGUI:
     def __init__(self, root):
@@ -12,17 +17,71 @@ class ConverterGUI:
         self.root.geometry("1100x600")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-        self.converter = PixelGridConverter()
+        # png_converter pulls in NumPy, so load it off the startup path
+        self.converter = None
+        self.session = None
+        self.converter_lock = threading.Lock()
+        self.job_queue = None
+        self.live_preview_job = None
+        self.live_preview_generation = 0
         self.grid_data = ""
+        self.result = None
         self.preview_length = 1000
         self.showing_full = False
-        self.preview_image = None
+        self.preview_renderer = None
+        # One PhotoImage per zoom level, repainted in place instead of rebuilt
+        self.preview_photos = {}
+        self.preview_item = None
+        self.zoom = 2
         
         self.setup_ui()
+        for var in (self.file_path_var, self.preserve_colors_var, self.dither_var, self.dither_space_var,
+                    self.resample_var, self.palette_var):
+            var.trace_add("write", self.schedule_live_preview)
+        self.setup_drop_target()
+        self.root.after(100, self.preload_converter)
+        self.root.after(50, self.poll_jobs)
+    
+    def get_converter(self):
+        with self.converter_lock:
+            if self.converter is None:
+                from png_converter import PixelGridConverter
+                from conversion_cache import ConversionCache
+                from conversion_session import ConversionSession
+                from conversion_jobs import JobQueue
+                cache = ConversionCache()
+                self.converter = PixelGridConverter(cache=cache)
+                self.session = ConversionSession(self.converter)
+                # Queued jobs share the preview's cache, so converting a previewed file is instant
+                self.job_queue = JobQueue(cache=cache)
+            return self.converter
+    
+    def get_session(self):
+        self.get_converter()
+        return self.session
+    
+    def preload_converter(self):
+        thread = threading.Thread(target=self.get_converter)
+        thread.daemon = True
+        thread.start()
     
     def on_closing(self):
+        if self.job_queue is not None:
+            self.job_queue.shutdown()
         self.root.destroy()
     
+    def setup_drop_target(self):
+        # Only when tkinterdnd2 is installed and main() created the window with it
+        if TkinterDnD is None or not hasattr(self.root, "drop_target_register"):
+            return
+        self.root.drop_target_register(DND_FILES)
+        self.root.dnd_bind("<<Drop>>", self.on_drop)
+    
+    def on_drop(self, event):
+        specs = list(self.root.tk.splitlist(event.data))
+        self.file_path_var.set("; ".join(specs))
+        self.enqueue_selected()
+    
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="15")
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -44,7 +103,8 @@ class ConverterGUI:
         file_frame = ttk.LabelFrame(parent, text="PNG File Selection", padding="10")
         file_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 15))
         
-        ttk.Label(file_frame, text="Select PNG file:").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        drop_hint = " (or drop files on the window)" if TkinterDnD is not None else ""
+        ttk.Label(file_frame, text=f"Select PNG files or folders{drop_hint}:").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
         
         entry_frame = ttk.Frame(file_frame)
         entry_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -56,8 +116,17 @@ class ConverterGUI:
         
         ttk.Button(entry_frame, text="Browse", command=self.browse_file).grid(row=0, column=1)
         
-        self.convert_btn = ttk.Button(file_frame, text="Convert to Pixel Grid", command=self.convert_image_async)
-        self.convert_btn.grid(row=2, column=0, pady=5)
+        folder_frame = ttk.Frame(file_frame)
+        folder_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        folder_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(folder_frame, text="Save results to folder:").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
+        self.output_folder_var = tk.StringVar()
+        ttk.Entry(folder_frame, textvariable=self.output_folder_var).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 10))
+        ttk.Button(folder_frame, text="Browse", command=self.browse_output_folder).grid(row=0, column=2)
+        
+        self.convert_btn = ttk.Button(file_frame, text="Convert to Pixel Grid", command=self.enqueue_selected)
+        self.convert_btn.grid(row=3, column=0, pady=5)
         
         file_frame.columnconfigure(0, weight=1)
     
@@ -67,11 +136,14 @@ class ConverterGUI:
         
         self.save_registry_var = tk.BooleanVar(value=True)
         self.preserve_colors_var = tk.BooleanVar(value=True)
+        self.registry_binary_var = tk.BooleanVar(value=False)
         
         ttk.Checkbutton(options_frame, text="Save to Unity Registry", 
                        variable=self.save_registry_var).grid(row=0, column=0, sticky=tk.W)
         ttk.Checkbutton(options_frame, text="Preserve Original Colors", 
                        variable=self.preserve_colors_var).grid(row=0, column=1, sticky=tk.W, padx=(30, 0))
+        ttk.Checkbutton(options_frame, text="Write registry as binary (Unity format)", 
+                       variable=self.registry_binary_var).grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
         
         registry_frame = ttk.Frame(options_frame)
         registry_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
@@ -97,6 +169,35 @@ class ConverterGUI:
         
         ttk.Button(key_frame, text="Check Keys", command=self.check_registry_keys).grid(row=0, column=2)
         
+        dither_frame = ttk.Frame(options_frame)
+        dither_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        
+        ttk.Label(dither_frame, text="Dithering:").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
+        
+        self.dither_var = tk.StringVar(value="none")
+        ttk.Combobox(dither_frame, textvariable=self.dither_var, state="readonly", width=18,
+                     values=["none", "floyd-steinberg", "sierra", "bayer"]).grid(row=0, column=1, sticky=tk.W)
+        
+        ttk.Label(dither_frame, text="Color Space:").grid(row=0, column=2, sticky=tk.W, padx=(20, 10))
+        
+        self.dither_space_var = tk.StringVar(value="linear")
+        ttk.Combobox(dither_frame, textvariable=self.dither_space_var, state="readonly", width=10,
+                     values=["linear", "lab"]).grid(row=0, column=3, sticky=tk.W)
+        
+        ttk.Label(dither_frame, text="Resampling:").grid(row=1, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        
+        self.resample_var = tk.StringVar(value="nearest")
+        ttk.Combobox(dither_frame, textvariable=self.resample_var, state="readonly", width=18,
+                     values=["nearest", "box", "area", "lanczos"]).grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+        
+        ttk.Label(dither_frame, text="Palette:").grid(row=1, column=2, sticky=tk.W, padx=(20, 10), pady=(5, 0))
+        
+        self.palette_var = tk.StringVar(value="magearena")
+        # Filled when opened, so listing palettes doesn't pull NumPy into startup
+        self.palette_combo = ttk.Combobox(dither_frame, textvariable=self.palette_var, state="readonly", width=10,
+                                          values=["magearena"], postcommand=self.fill_palettes)
+        self.palette_combo.grid(row=1, column=3, sticky=tk.W, pady=(5, 0))
+        
         options_frame.columnconfigure(0, weight=1)
         options_frame.columnconfigure(1, weight=1)
     
@@ -139,12 +240,27 @@ class ConverterGUI:
         
         self.preview_canvas = tk.Canvas(canvas_frame, width=200, height=132, bg='white', relief=tk.SUNKEN, bd=1)
         self.preview_canvas.grid(row=0, column=0)
+        # Drag to pan, wheel to zoom (Button-4/5 are the wheel on X11)
+        self.preview_canvas.bind("<ButtonPress-1>", lambda e: self.preview_canvas.scan_mark(e.x, e.y))
+        self.preview_canvas.bind("<B1-Motion>", lambda e: self.preview_canvas.scan_dragto(e.x, e.y, gain=1))
+        self.preview_canvas.bind("<MouseWheel>", lambda e: self.change_zoom(1 if e.delta > 0 else -1))
+        self.preview_canvas.bind("<Button-4>", lambda e: self.change_zoom(1))
+        self.preview_canvas.bind("<Button-5>", lambda e: self.change_zoom(-1))
+        
+        zoom_frame = ttk.Frame(canvas_frame)
+        zoom_frame.grid(row=1, column=0, pady=(5, 0))
+        ttk.Button(zoom_frame, text="-", width=3, command=lambda: self.change_zoom(-1)).grid(row=0, column=0)
+        self.zoom_label = ttk.Label(zoom_frame, text=f"{self.zoom}x", width=5, anchor=tk.CENTER)
+        self.zoom_label.grid(row=0, column=1)
+        ttk.Button(zoom_frame, text="+", width=3, command=lambda: self.change_zoom(1)).grid(row=0, column=2)
         
         self.preview_label = ttk.Label(preview_frame, text="No preview available", anchor=tk.CENTER)
         self.preview_label.grid(row=1, column=0, pady=5)
         
+        self.create_jobs_section(preview_frame)
+        
         console_frame = ttk.LabelFrame(preview_frame, text="Console Log", padding="5")
-        console_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        console_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         console_frame.columnconfigure(0, weight=1)
         console_frame.rowconfigure(0, weight=1)
         
@@ -161,10 +277,41 @@ class ConverterGUI:
         self.console_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         credits_label = ttk.Label(preview_frame, text="Made by Jumper & Daikirai", anchor=tk.CENTER, font=("Arial", 8))
-        credits_label.grid(row=3, column=0, pady=(5, 0))
+        credits_label.grid(row=4, column=0, pady=(5, 0))
         
         preview_frame.columnconfigure(0, weight=1)
-        preview_frame.rowconfigure(2, weight=1)
+        preview_frame.rowconfigure(3, weight=1)
+    
+    def create_jobs_section(self, parent):
+        jobs_frame = ttk.LabelFrame(parent, text="Jobs", padding="5")
+        jobs_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
+        jobs_frame.columnconfigure(0, weight=1)
+        
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=("status", "time"), height=5, selectmode="extended")
+        self.jobs_tree.heading("#0", text="File")
+        self.jobs_tree.heading("status", text="Status")
+        self.jobs_tree.heading("time", text="Time")
+        self.jobs_tree.column("#0", width=140)
+        self.jobs_tree.column("status", width=70, anchor=tk.CENTER)
+        self.jobs_tree.column("time", width=70, anchor=tk.E)
+        self.jobs_tree.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.jobs_tree.bind("<<TreeviewSelect>>", self.on_job_selected)
+        
+        scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.jobs_tree.config(yscrollcommand=scrollbar.set)
+        
+        self.jobs_progress = ttk.Progressbar(jobs_frame, mode="determinate")
+        self.jobs_progress.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        # Progress has its own label, so it never overwrites messages in the status bar
+        self.jobs_progress_var = tk.StringVar()
+        ttk.Label(jobs_frame, textvariable=self.jobs_progress_var).grid(row=2, column=0, columnspan=2, sticky=tk.W)
+        
+        button_frame = ttk.Frame(jobs_frame)
+        button_frame.grid(row=3, column=0, columnspan=2, pady=(5, 0))
+        ttk.Button(button_frame, text="Cancel Selected", command=self.cancel_selected_jobs).grid(row=0, column=0, padx=(0, 5))
+        ttk.Button(button_frame, text="Cancel All", command=self.cancel_all_jobs).grid(row=0, column=1, padx=(0, 5))
+        ttk.Button(button_frame, text="Clear Finished", command=self.clear_finished_jobs).grid(row=0, column=2)
     
     def configure_grid_weights(self):
         self.root.columnconfigure(0, weight=1)
@@ -180,17 +327,23 @@ class ConverterGUI:
         left_frame.rowconfigure(2, weight=1)
     
     def browse_file(self):
-        file_path = filedialog.askopenfilename(
-            title="Select PNG Image",
-            filetypes=[("PNG files", "*.png"), ("All files", "*.*")]
+        file_paths = filedialog.askopenfilenames(
+            title="Select PNG Images",
+            filetypes=[("PNG files", "*.png"), ("Image files", "*.png *.jpg *.jpeg *.bmp *.gif *.webp"), ("All files", "*.*")]
         )
-        if file_path:
-            self.file_path_var.set(file_path)
+        if file_paths:
+            self.file_path_var.set("; ".join(file_paths))
     
-    def convert_image_async(self):
-        thread = threading.Thread(target=self.convert_image)
-        thread.daemon = True
-        thread.start()
+    def browse_output_folder(self):
+        folder = filedialog.askdirectory(title="Save Results To")
+        if folder:
+            self.output_folder_var.set(folder)
+    
+    def selected_paths(self):
+        # The entry holds "; "-separated files, folders or glob patterns
+        from batch_convert import collect_inputs
+        specs = [spec.strip() for spec in self.file_path_var.get().split(";") if spec.strip()]
+        return collect_inputs(specs)
     
     def find_registry_path(self):
         dialog = tk.Toplevel(self.root)
@@ -248,143 +401,215 @@ class ConverterGUI:
         ttk.Button(button_frame, text="Use Manual", command=use_manual).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
     
+    def registry_index(self):
+        from registry_backend import default_index
+        return default_index()
+    
     def scan_registry_paths(self):
-        import winreg
-        paths = []
-        
+        # The index re-reads only keys that changed since the last scan
+        index = self.registry_index()
+        if index is None:
+            return []
         try:
-            base_paths = [
-                "SOFTWARE\\Unity\\UnityEditor",
-                "SOFTWARE"
-            ]
-            
-            for base_path in base_paths:
-                try:
-                    base_key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, base_path)
-                    i = 0
-                    while True:
-                        try:
-                            company = winreg.EnumKey(base_key, i)
-                            if base_path == "SOFTWARE\\Unity\\UnityEditor":
-                                company_path = f"{base_path}\\{company}"
-                            else:
-                                company_path = f"{base_path}\\{company}"
-                            
-                            try:
-                                company_key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, company_path)
-                                j = 0
-                                while True:
-                                    try:
-                                        product = winreg.EnumKey(company_key, j)
-                                        full_path = f"{company_path}\\{product}"
-                                        
-                                        try:
-                                            test_key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, full_path)
-                                            k = 0
-                                            has_unity_values = False
-                                            while k < 10:
-                                                try:
-                                                    value_name, _, _ = winreg.EnumValue(test_key, k)
-                                                    if any(keyword in value_name.lower() for keyword in ['flag', 'grid', 'game', 'unity']):
-                                                        has_unity_values = True
-                                                        break
-                                                    k += 1
-                                                except WindowsError:
-                                                    break
-                                            
-                                            if has_unity_values or company.lower() in ['jrsjams', 'unity']:
-                                                paths.append(full_path)
-                                            
-                                            winreg.CloseKey(test_key)
-                                        except WindowsError:
-                                            pass
-                                        
-                                        j += 1
-                                    except WindowsError:
-                                        break
-                                winreg.CloseKey(company_key)
-                            except WindowsError:
-                                pass
-                            
-                            i += 1
-                        except WindowsError:
-                            break
-                    winreg.CloseKey(base_key)
-                except WindowsError:
-                    pass
-                    
+            return index.unity_paths()
         except Exception as e:
             print(f"Error scanning registry: {e}")
-        
-        return paths
+            return []
 
-    def convert_image(self):
-        png_path = self.file_path_var.get().strip()
-        
-        if not png_path:
-            self.root.after(0, lambda: messagebox.showerror("Error", "Please select a PNG file first."))
+    def enqueue_selected(self):
+        paths = self.selected_paths()
+        if not paths:
+            self.status_var.set("Please select a PNG file first.")
             return
         
-        if not os.path.exists(png_path):
-            self.root.after(0, lambda: messagebox.showerror("Error", "Selected file does not exist."))
+        converter = self.get_converter()
+        preserve_colors = self.preserve_colors_var.get()
+        options = self.conversion_options()
+        output_folder = self.output_folder_var.get().strip()
+        outputs = {}
+        if output_folder:
+            from batch_convert import plan_outputs
+            os.makedirs(output_folder, exist_ok=True)
+            outputs = dict(plan_outputs(paths, output_folder))
+        
+        # Registry saves only make sense for a single flag, batches just convert (and save to the folder)
+        save_registry = self.save_registry_var.get() and len(paths) == 1
+        registry_path = self.registry_path_var.get().strip() or converter.unity_registry_path
+        registry_key = self.registry_key_var.get().strip()
+        binary = self.registry_binary_var.get()
+        if save_registry:
+            self.log_to_console(f"Registry path: {registry_path}")
+            self.log_to_console(f"Registry key: {registry_key}")
+        
+        def after(job):
+            # Runs on the worker thread, the returned message goes to the console
+            messages = []
+            output_path = outputs.get(job.path)
+            if output_path:
+                job.result.save(output_path)
+                messages.append(f"Saved {os.path.basename(output_path)}")
+            if save_registry:
+                from png_converter import registry_available
+                if not registry_available():
+                    messages.append("Registry save skipped - not on Windows")
+                else:
+                    try:
+                        if job.result.converter.save_to_unity_registry(job.result.grid_data, binary,
+                                                                       registry_path, registry_key):
+                            messages.append("Successfully saved to Unity registry!")
+                        else:
+                            messages.append("Registry already holds this flag, nothing written")
+                    except OSError as e:
+                        messages.append(f"Failed to save to Unity registry - check registry path ({e})")
+            return "\n".join(messages)
+        
+        # A preview still running must not replace what the jobs show
+        self.live_preview_generation += 1
+        for path in paths:
+            job = self.job_queue.submit(path, preserve_colors, options, after)
+            self.jobs_tree.insert("", tk.END, iid=str(job.id), text=os.path.basename(path), values=(job.status, ""))
+        self.status_var.set(f"Queued {len(paths)} file{'s' if len(paths) != 1 else ''}")
+        self.update_job_progress()
+    
+    def poll_jobs(self):
+        # The only place job updates reach Tk: workers post to the queue, this drains it
+        if self.job_queue is not None:
+            statuses = 0
+            for kind, job, detail in self.job_queue.poll():
+                if kind == "log":
+                    self.log_to_console(detail)
+                elif kind == "preview":
+                    self.show_live_preview(*detail)
+                elif kind == "preview_failed":
+                    self.status_var.set(detail)
+                else:
+                    self.update_job_row(job, detail)
+                    statuses += 1
+            if statuses:
+                self.update_job_progress()
+        self.root.after(50, self.poll_jobs)
+    
+    def update_job_row(self, job, status):
+        # status is the one the event was posted with, the job itself may have moved on
+        from conversion_jobs import DONE, FAILED
+        iid = str(job.id)
+        if not self.jobs_tree.exists(iid):
+            return
+        elapsed = f"{job.elapsed_ms:.0f} ms" if job.elapsed_ms is not None else ""
+        self.jobs_tree.item(iid, values=(status, elapsed))
+        name = os.path.basename(job.path)
+        if status == DONE:
+            self.log_to_console(f"{name}: converted in {job.elapsed_ms:.1f} ms")
+            if not self.jobs_tree.selection():
+                self.show_result(job.result)
+        elif status == FAILED:
+            self.log_to_console(f"ERROR: {name}: {job.error}")
+    
+    def update_job_progress(self):
+        counts = self.job_queue.counts()
+        total = sum(counts.values())
+        finished = counts["done"] + counts["failed"] + counts["cancelled"]
+        self.jobs_progress.config(maximum=max(total, 1), value=finished)
+        if total and finished == total:
+            self.jobs_progress_var.set(f"Finished {counts['done']} of {total} jobs"
+                                       f" ({counts['failed']} failed, {counts['cancelled']} cancelled)")
+        elif total:
+            self.jobs_progress_var.set(f"Converting... {finished}/{total} done, {counts['running']} running")
+        else:
+            self.jobs_progress_var.set("")
+    
+    def on_job_selected(self, event=None):
+        from conversion_jobs import DONE, FAILED
+        selection = self.jobs_tree.selection()
+        if len(selection) != 1:
+            return
+        job = self.job_queue.jobs.get(int(selection[0]))
+        if job is None:
+            return
+        if job.status == DONE:
+            self.show_result(job.result)
+        elif job.status == FAILED:
+            self.status_var.set(f"{os.path.basename(job.path)} failed: {job.error}")
+    
+    def selected_job_ids(self):
+        return [int(iid) for iid in self.jobs_tree.selection()]
+    
+    def cancel_selected_jobs(self):
+        if self.job_queue is None:
+            return
+        for job_id in self.selected_job_ids():
+            self.job_queue.cancel(job_id)
+    
+    def cancel_all_jobs(self):
+        if self.job_queue is not None:
+            self.job_queue.cancel_all()
+    
+    def clear_finished_jobs(self):
+        if self.job_queue is None:
+            return
+        for job_id in self.job_queue.forget_finished():
+            if self.jobs_tree.exists(str(job_id)):
+                self.jobs_tree.delete(str(job_id))
+        self.update_job_progress()
+    
+    def conversion_options(self):
+        return {"dither": self.dither_var.get(), "dither_space": self.dither_space_var.get(),
+                "resample": self.resample_var.get(), "palette": self.palette_var.get()}
+    
+    def fill_palettes(self):
+        from palette import available_palettes
+        self.palette_combo.config(values=available_palettes())
+    
+    def schedule_live_preview(self, *args):
+        # Wait for the options to settle before re-running anything
+        if self.live_preview_job is not None:
+            self.root.after_cancel(self.live_preview_job)
+        self.live_preview_job = self.root.after(250, self.start_live_preview)
+    
+    def start_live_preview(self):
+        self.live_preview_job = None
+        png_path = self.file_path_var.get().strip()
+        if not png_path or not os.path.isfile(png_path):
             return
         
-        custom_path = self.registry_path_var.get().strip()
-        custom_key = self.registry_key_var.get().strip()
-        if custom_path:
-            self.converter.unity_registry_path = custom_path
-        if custom_key:
-            self.converter.registry_key_name = custom_key
+        self.live_preview_generation += 1
+        generation = self.live_preview_generation
+        options = self.conversion_options()
+        preserve_colors = self.preserve_colors_var.get()
         
-        self.root.after(0, lambda: self.set_converting_state(True))
-        self.root.after(0, lambda: self.clear_console())
-        self.root.after(0, lambda: self.log_to_console(f"Loading PNG image: {os.path.basename(png_path)}"))
-        self.root.after(0, lambda: self.log_to_console(f"Registry path: {self.converter.unity_registry_path}"))
-        self.root.after(0, lambda: self.log_to_console(f"Registry key: {self.converter.registry_key_name}"))
+        def run():
+            # Reported through the job queue like conversions, poll_jobs shows it
+            session = self.get_session()
+            instrumentation = Instrumentation()
+            try:
+                result = session.convert(png_path, preserve_colors, instrumentation, **options)
+            except Exception as e:
+                self.job_queue.post("preview_failed", None, f"Preview failed: {e}")
+                return
+            total = instrumentation.summary()["wall_ms"]
+            self.job_queue.post("preview", None, (result, generation, total))
         
-        try:
-            self.grid_data = self.converter.convert_png_to_pixel_grid(
-                png_path,
-                save_to_registry=False,
-                save_to_file=False,
-                preserve_colors=self.preserve_colors_var.get()
-            )
-            
-            if self.grid_data:
-                self.root.after(0, lambda: self.log_to_console("Image resized to 100x66"))
-                self.root.after(0, lambda: self.log_to_console("Converting to UV coordinates..."))
-                self.root.after(0, lambda: self.log_to_console("Serializing grid data..."))
-                
-                if self.save_registry_var.get():
-                    if os.name == 'nt':
-                        self.root.after(0, lambda: self.log_to_console("Saving to Unity registry..."))
-                        registry_success = self.converter.save_to_unity_registry(self.grid_data)
-                        if registry_success:
-                            self.root.after(0, lambda: self.log_to_console("Successfully saved to Unity registry!"))
-                        else:
-                            self.root.after(0, lambda: self.log_to_console("Failed to save to Unity registry - check registry path"))
-                    else:
-                        self.root.after(0, lambda: self.log_to_console("Registry save skipped - not on Windows"))
-                
-                self.root.after(0, lambda: self.log_to_console("Conversion completed successfully!"))
-                self.root.after(0, self.show_conversion_success)
-            else:
-                self.root.after(0, lambda: self.log_to_console("ERROR: Failed to convert image"))
-                self.root.after(0, lambda: self.show_conversion_error("Failed to convert image."))
-                
-        except Exception as e:
-            error_msg = f"Conversion failed: {str(e)}"
-            self.root.after(0, lambda: self.log_to_console(f"ERROR: {error_msg}"))
-            self.root.after(0, lambda: self.show_conversion_error(error_msg))
-    
-    def set_converting_state(self, converting):
-        if converting:
-            self.convert_btn.config(state=tk.DISABLED, text="Converting...")
-            self.status_var.set("Converting image...")
-        else:
-            self.convert_btn.config(state=tk.NORMAL, text="Convert to Pixel Grid")
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
     
-    def show_conversion_success(self):
+    def show_live_preview(self, result, generation, elapsed_ms):
+        # A newer preview or a full conversion started in the meantime
+        if generation != self.live_preview_generation:
+            return
+        self.result = result
+        self.grid_data = result.grid_data
+        self.showing_full = False
+        self.update_output_display()
+        self.update_preview()
+        self.show_more_btn.config(state=tk.NORMAL)
+        self.copy_btn.config(state=tk.NORMAL)
+        self.export_btn.config(state=tk.NORMAL)
+        self.status_var.set(f"Preview updated in {elapsed_ms:.1f} ms - click Convert to save")
+    
+    def show_result(self, result):
+        self.result = result
+        self.grid_data = result.grid_data
         self.showing_full = False
         self.update_output_display()
         self.update_preview()
@@ -393,10 +618,7 @@ class ConverterGUI:
         self.copy_btn.config(state=tk.NORMAL)
         self.export_btn.config(state=tk.NORMAL)
         
-        pixel_count = len(self.grid_data.split(','))
-        self.status_var.set(f"Conversion completed! Grid size: {pixel_count} pixels")
-        self.set_converting_state(False)
-        messagebox.showinfo("Success", "Image converted successfully!")
+        self.status_var.set(f"Showing {os.path.basename(result.source)} - grid size: {result.cell_count} pixels")
     
     def update_output_display(self):
         self.output_text.config(state=tk.NORMAL)
@@ -419,18 +641,43 @@ class ConverterGUI:
     
     def update_preview(self):
         try:
-            if os.path.exists("resized_image.png"):
-                img = Image.open("resized_image.png")
-                img = img.resize((200, 132), Image.NEAREST)
-                self.preview_image = ImageTk.PhotoImage(img)
-                
-                self.preview_canvas.delete("all")
-                self.preview_canvas.create_image(100, 66, image=self.preview_image)
-                self.preview_label.config(text="Quantized preview (scaled 2x)")
-            else:
+            if self.result is None:
                 self.preview_label.config(text="Preview not available")
+                return
+            
+            # Drawn from the palette indices, the text grid and PIL preview are never touched
+            from grid_preview import GridPreview
+            if self.preview_renderer is None:
+                self.preview_renderer = GridPreview()
+            result = self.result
+            image = self.preview_renderer.render(result.indices, result.converter.palette, self.zoom)
+            
+            key = (self.zoom, image.size)
+            photo = self.preview_photos.get(key)
+            if photo is None:
+                photo = ImageTk.PhotoImage(image)
+                self.preview_photos[key] = photo
+            else:
+                photo.paste(image)
+            
+            if self.preview_item is None:
+                self.preview_item = self.preview_canvas.create_image(0, 0, image=photo, anchor=tk.NW)
+            else:
+                self.preview_canvas.itemconfig(self.preview_item, image=photo)
+            self.preview_canvas.config(scrollregion=(0, 0, image.width, image.height))
+            self.preview_label.config(text=f"{result.width}x{result.height}, {result.cell_count} cells, "
+                                           f"{result.color_count} colors ({self.zoom}x)")
         except Exception as e:
-            self.preview_label.config(text="Error loading preview")
+            self.preview_label.config(text=f"Error loading preview: {e}")
+    
+    def change_zoom(self, step):
+        from grid_preview import ZOOM_LEVELS
+        position = ZOOM_LEVELS.index(self.zoom) + step
+        if not 0 <= position < len(ZOOM_LEVELS):
+            return
+        self.zoom = ZOOM_LEVELS[position]
+        self.zoom_label.config(text=f"{self.zoom}x")
+        self.update_preview()
     
     def toggle_output_view(self):
         if len(self.grid_data) <= self.preview_length:
@@ -439,24 +686,18 @@ class ConverterGUI:
         self.showing_full = not self.showing_full
         self.update_output_display()
     
-    def show_conversion_error(self, error_message):
-        self.status_var.set("Conversion failed.")
-        self.set_converting_state(False)
-        messagebox.showerror("Error", error_message)
-    
     def copy_to_clipboard(self):
         if not self.grid_data:
-            messagebox.showerror("Error", "No data to copy.")
+            self.status_var.set("No data to copy.")
             return
         
         self.root.clipboard_clear()
         self.root.clipboard_append(self.grid_data)
         self.status_var.set("Data copied to clipboard!")
-        messagebox.showinfo("Success", "Grid data copied to clipboard!")
     
     def export_data(self):
         if not self.grid_data:
-            messagebox.showerror("Error", "No data to export.")
+            self.status_var.set("No data to export.")
             return
         
         file_path = filedialog.asksaveasfilename(
@@ -471,10 +712,9 @@ class ConverterGUI:
                     f.write(self.grid_data)
                 
                 self.status_var.set(f"Data exported to: {os.path.basename(file_path)}")
-                messagebox.showinfo("Success", f"Data exported successfully!")
                 
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to export data: {str(e)}")
+                self.status_var.set(f"Failed to export data: {str(e)}")
 
     def log_to_console(self, message):
         self.console_text.config(state=tk.NORMAL)
@@ -490,7 +730,7 @@ class ConverterGUI:
     def check_registry_keys(self):
         registry_path = self.registry_path_var.get().strip()
         if not registry_path:
-            messagebox.showerror("Error", "Please enter a registry path first.")
+            self.status_var.set("Please enter a registry path first.")
             return
         
         dialog = tk.Toplevel(self.root)
@@ -511,35 +751,20 @@ class ConverterGUI:
         listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=listbox.yview)
         
+        from registry_backend import type_name
+        index = self.registry_index()
         try:
-            import winreg
-            key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, registry_path, 0, winreg.KEY_READ)
-            
-            keys_found = []
-            i = 0
-            while True:
-                try:
-                    value_name, value_data, value_type = winreg.EnumValue(key, i)
-                    type_name = {
-                        winreg.REG_SZ: "STRING",
-                        winreg.REG_BINARY: "BINARY",
-                        winreg.REG_DWORD: "DWORD"
-                    }.get(value_type, f"TYPE_{value_type}")
-                    
-                    keys_found.append(f"{value_name} ({type_name})")
-                    i += 1
-                except WindowsError:
-                    break
-            
-            winreg.CloseKey(key)
+            if index is None:
+                raise OSError("no registry on this system")
+            values = index.values(registry_path)
             
-            if keys_found:
-                for key_info in keys_found:
-                    listbox.insert(tk.END, key_info)
+            if values:
+                for value_name, (_, value_type) in values.items():
+                    listbox.insert(tk.END, f"{value_name} ({type_name(value_type)})")
             else:
                 listbox.insert(tk.END, "No keys found at this path")
                 
-        except WindowsError as e:
+        except OSError as e:
             listbox.insert(tk.END, f"Error accessing registry: {e}")
             listbox.insert(tk.END, "Path may not exist or access denied")
         
@@ -559,7 +784,7 @@ class ConverterGUI:
         ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
 
 def main():
-    root = tk.Tk()
+    root = TkinterDnD.Tk() if TkinterDnD is not None else tk.Tk()
     app = ConverterGUI(root)
     root.mainloop()
 
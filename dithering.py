@@ -0,0 +1,143 @@
+from functools import lru_cache
+
+import numpy as np
+
+from color_lut import linear_to_lab, srgb_to_linear
+
+DITHER_METHODS = ("none", "floyd-steinberg", "sierra", "bayer")
+DITHER_SPACES = ("linear", "lab")
+
+# (row offset, column offset, weight) of the error pushed to each neighbour
+KERNELS = {
+    "floyd-steinberg": (
+        (0, 1, 7 / 16),
+        (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16),
+    ),
+    "sierra": (
+        (0, 1, 5 / 32), (0, 2, 3 / 32),
+        (1, -2, 2 / 32), (1, -1, 4 / 32), (1, 0, 5 / 32), (1, 1, 4 / 32), (1, 2, 2 / 32),
+        (2, -1, 2 / 32), (2, 0, 3 / 32), (2, 1, 2 / 32),
+    ),
+}
+
+# How far the Bayer threshold moves a pixel, in units of each space
+BAYER_SPREAD = {"linear": 0.25, "lab": 24.0}
+
+
+def to_dither_space(rgb, space):
+    linear = srgb_to_linear(rgb)
+    if space == "lab":
+        return linear_to_lab(linear)
+    return linear
+
+
+def nearest_indices(pixels, palette_pixels, palette_norms=None):
+    # |p - q|^2 without the |p|^2 term, which is the same for every palette entry
+    if palette_norms is None:
+        palette_norms = (palette_pixels ** 2).sum(axis=1)
+    distance = palette_norms - 2 * (pixels @ palette_pixels.T)
+    return distance.argmin(axis=1).astype(np.uint8)
+
+
+def wavefront_step(kernel):
+    # Pixel (y, x) only depends on pixels with a smaller x + step * y, so every pixel
+    # on the same anti-diagonal can be quantized at once
+    step = 1
+    for dy, dx, _ in kernel:
+        if dy > 0:
+            step = max(step, -dx // dy + 1)
+    return step
+
+
+@lru_cache(maxsize=32)
+def wavefront_plan(height, width, kernel):
+    # Flat buffer positions for every wavefront, plus where each one pushes its error
+    step = wavefront_step(kernel)
+    pad = max(max(abs(dx) for _, dx, _ in kernel), 1)
+    stride = width + 2 * pad
+    offsets = np.array([dy * stride + dx for dy, dx, _ in kernel])
+
+    ys, xs = np.divmod(np.arange(height * width), width)
+    t = xs + step * ys
+    order = np.argsort(t, kind="stable")
+    splits = np.flatnonzero(np.diff(t[order])) + 1
+
+    plan = []
+    for group in np.split(order, splits):
+        cells = ys[group] * stride + xs[group] + pad
+        plan.append((cells, group, (cells[:, None] + offsets[None, :]).ravel()))
+    return pad, stride, plan
+
+
+def error_diffusion(pixels, palette_pixels, kernel, clip=None):
+    height, width, channels = pixels.shape
+    kernel = tuple(kernel)
+    pad, stride, plan = wavefront_plan(height, width, kernel)
+    rows = max(dy for dy, _, _ in kernel)
+    weights = np.array([weight for _, _, weight in kernel])[None, :, None]
+
+    # Padding soaks up error pushed past the image edges
+    buffer = np.zeros((height + rows, stride, channels))
+    buffer[:height, pad:pad + width] = pixels
+    buffer = buffer.reshape(-1, channels)
+    indices = np.empty(height * width, dtype=np.uint8)
+    palette_norms = (palette_pixels ** 2).sum(axis=1)
+
+    for cells, positions, targets in plan:
+        values = buffer[cells]
+        if clip is not None:
+            np.clip(values, clip[0], clip[1], out=values)
+
+        chosen = nearest_indices(values, palette_pixels, palette_norms)
+        indices[positions] = chosen
+        error = values - palette_pixels[chosen]
+        # Neighbours of different pixels in a wavefront can overlap, so accumulate with add.at
+        np.add.at(buffer, targets, (error[:, None, :] * weights).reshape(-1, channels))
+
+    return indices.reshape(height, width)
+
+
+@lru_cache(maxsize=4)
+def bayer_matrix(size=8):
+    matrix = np.zeros((1, 1))
+    while matrix.shape[0] < size:
+        matrix = np.block([
+            [4 * matrix, 4 * matrix + 2],
+            [4 * matrix + 3, 4 * matrix + 1],
+        ])
+    # Centered thresholds in (-0.5, 0.5)
+    return (matrix + 0.5) / matrix.size - 0.5
+
+
+def ordered_dither(pixels, palette_pixels, space, size=8):
+    height, width, _ = pixels.shape
+    matrix = bayer_matrix(size)
+    threshold = np.tile(matrix, (height // size + 1, width // size + 1))[:height, :width]
+
+    offset = threshold * BAYER_SPREAD[space]
+    pixels = pixels.copy()
+    if space == "lab":
+        pixels[..., 0] += offset
+    else:
+        pixels += offset[..., None]
+
+    return nearest_indices(pixels.reshape(-1, 3), palette_pixels).reshape(height, width)
+
+
+def check_options(method, space):
+    if method not in DITHER_METHODS or method == "none":
+        raise ValueError(f"Unknown dither method '{method}', expected one of {', '.join(DITHER_METHODS[1:])}")
+    if space not in DITHER_SPACES:
+        raise ValueError(f"Unknown dither space '{space}', expected one of {', '.join(DITHER_SPACES)}")
+
+
+def dither_converted(pixels, palette_rgb, method="floyd-steinberg", space="linear"):
+    # pixels are already in the dither space, so callers can keep them between runs
+    check_options(method, space)
+    palette_pixels = to_dither_space(palette_rgb, space)
+
+    if method == "bayer":
+        return ordered_dither(pixels, palette_pixels, space)
+
+    clip = (0.0, 1.0) if space == "linear" else None
+    return error_diffusion(pixels, palette_pixels, KERNELS[method], clip)
@@ -0,0 +1,209 @@
+import sys
+import threading
+import time
+
+# An in-memory stand-in for the parts of winreg this project uses, so registry code runs on
+# any OS. install() makes "import winreg" return this module
+HKEY_CLASSES_ROOT = 0x80000000
+HKEY_CURRENT_USER = 0x80000001
+HKEY_LOCAL_MACHINE = 0x80000002
+HKEY_USERS = 0x80000003
+
+KEY_READ = 0x20019
+KEY_WRITE = 0x20006
+KEY_ALL_ACCESS = 0xF003F
+
+REG_NONE = 0
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+
+ERROR_FILE_NOT_FOUND = 2
+ERROR_NO_MORE_ITEMS = 259
+
+# FILETIME counts 100 ns ticks from 1601, time.time_ns() from 1970
+_FILETIME_OFFSET = 116444736000000000
+
+_lock = threading.RLock()
+_last_stamp = 0
+
+
+def _stamp():
+    # Strictly increasing, so two writes in the same tick still look like a change
+    global _last_stamp
+    _last_stamp = max(_last_stamp + 1, time.time_ns() // 100 + _FILETIME_OFFSET)
+    return _last_stamp
+
+
+class _Key:
+    def __init__(self, name):
+        self.name = name
+        self.subkeys = {}
+        self.values = {}
+        self.modified = _stamp()
+
+
+class HKEYType:
+    def __init__(self, key, access):
+        self.key = key
+        self.access = access
+        self.closed = False
+
+    def Close(self):
+        self.closed = True
+
+    def Detach(self):
+        self.closed = True
+        return 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.Close()
+
+    def __bool__(self):
+        return not self.closed
+
+
+_hives = {}
+
+
+def reset():
+    with _lock:
+        _hives.clear()
+        for hive in (HKEY_CLASSES_ROOT, HKEY_CURRENT_USER, HKEY_LOCAL_MACHINE, HKEY_USERS):
+            _hives[hive] = _Key("")
+
+
+def install():
+    reset()
+    sys.modules["winreg"] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+def _not_found():
+    return FileNotFoundError(ERROR_FILE_NOT_FOUND, "The system cannot find the file specified")
+
+
+def _resolve(key):
+    if isinstance(key, HKEYType):
+        if key.closed:
+            raise OSError(6, "The handle is invalid")
+        return key.key
+    try:
+        return _hives[key]
+    except KeyError:
+        raise _not_found()
+
+
+def _parts(sub_key):
+    return [part for part in (sub_key or "").split("\\") if part]
+
+
+def OpenKey(key, sub_key, reserved=0, access=KEY_READ):
+    with _lock:
+        current = _resolve(key)
+        for part in _parts(sub_key):
+            current = current.subkeys.get(part.lower())
+            if current is None:
+                raise _not_found()
+        return HKEYType(current, access)
+
+
+OpenKeyEx = OpenKey
+
+
+def CreateKeyEx(key, sub_key, reserved=0, access=KEY_WRITE):
+    # Like the registry, adding a key touches the parent it was added to
+    with _lock:
+        current = _resolve(key)
+        for part in _parts(sub_key):
+            child = current.subkeys.get(part.lower())
+            if child is None:
+                child = _Key(part)
+                current.subkeys[part.lower()] = child
+                current.modified = _stamp()
+            current = child
+        return HKEYType(current, access)
+
+
+def CreateKey(key, sub_key):
+    return CreateKeyEx(key, sub_key, 0, KEY_ALL_ACCESS)
+
+
+def CloseKey(key):
+    key.Close()
+
+
+def QueryInfoKey(key):
+    with _lock:
+        current = _resolve(key)
+        return len(current.subkeys), len(current.values), current.modified
+
+
+def EnumKey(key, index):
+    with _lock:
+        subkeys = list(_resolve(key).subkeys.values())
+        if not 0 <= index < len(subkeys):
+            raise OSError(ERROR_NO_MORE_ITEMS, "No more data is available")
+        return subkeys[index].name
+
+
+def EnumValue(key, index):
+    with _lock:
+        values = list(_resolve(key).values.items())
+        if not 0 <= index < len(values):
+            raise OSError(ERROR_NO_MORE_ITEMS, "No more data is available")
+        name, (data, value_type) = values[index]
+        return name, data, value_type
+
+
+def QueryValueEx(key, name):
+    with _lock:
+        try:
+            return _resolve(key).values[name]
+        except KeyError:
+            raise _not_found()
+
+
+def SetValueEx(key, name, reserved, value_type, value):
+    # Same type checks as winreg, so a wrong type fails here too
+    if value_type in (REG_SZ, REG_EXPAND_SZ) and not isinstance(value, str):
+        raise ValueError("Could not convert the data to the specified type.")
+    if value_type == REG_DWORD and not isinstance(value, int):
+        raise ValueError("Could not convert the data to the specified type.")
+    if value_type == REG_BINARY:
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            raise TypeError("Objects of type '%s' can not be used as binary registry values" % type(value).__name__)
+        value = bytes(value)
+    with _lock:
+        current = _resolve(key)
+        current.values[name] = (value, value_type)
+        current.modified = _stamp()
+
+
+def DeleteValue(key, name):
+    with _lock:
+        current = _resolve(key)
+        if name not in current.values:
+            raise _not_found()
+        del current.values[name]
+        current.modified = _stamp()
+
+
+def DeleteKey(key, sub_key):
+    with _lock:
+        parts = _parts(sub_key)
+        parent = _resolve(OpenKey(key, "\\".join(parts[:-1])))
+        child = parent.subkeys.get(parts[-1].lower()) if parts else None
+        if child is None:
+            raise _not_found()
+        if child.subkeys:
+            raise PermissionError(5, "Access is denied")
+        del parent.subkeys[parts[-1].lower()]
+        parent.modified = _stamp()
+
+
+reset()
@@ -0,0 +1,429 @@
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_DB = "flags.db"
+# dHash bits are split into bands, two hashes within BANDS - 1 bits of each other always share one
+BANDS = 8
+BAND_BITS = 64 // BANDS
+NEAR_DISTANCE = 6
+GRID_EXTENSIONS = (".txt", ".reg")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS flags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    source_hash TEXT,
+    grid_hash TEXT NOT NULL,
+    phash INTEGER NOT NULL,
+    {", ".join(f"band{i} INTEGER NOT NULL" for i in range(BANDS))},
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    indices BLOB NOT NULL,
+    grid BLOB NOT NULL,
+    thumbnail BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    flag_id INTEGER NOT NULL REFERENCES flags(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, flag_id)
+) WITHOUT ROWID;
+-- Every imported source, also those whose grid was already in the library
+CREATE TABLE IF NOT EXISTS sources (
+    source_hash TEXT PRIMARY KEY,
+    flag_id INTEGER NOT NULL REFERENCES flags(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sources_flag ON sources(flag_id);
+CREATE INDEX IF NOT EXISTS flags_name ON flags(name);
+CREATE INDEX IF NOT EXISTS flags_source_hash ON flags(source_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS flags_grid_hash ON flags(grid_hash);
+CREATE INDEX IF NOT EXISTS tags_flag ON tags(flag_id);
+{"".join(f"CREATE INDEX IF NOT EXISTS flags_band{i} ON flags(band{i});" for i in range(BANDS))}
+"""
+
+
+def dhash(rgb):
+    # 64-bit difference hash of a small grayscale version: one bit per horizontal brightness step
+    gray = Image.fromarray(np.ascontiguousarray(rgb), "RGB").convert("L").resize((9, 8), Image.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def bands(phash):
+    mask = (1 << BAND_BITS) - 1
+    return [(phash >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+def source_key(path, settings):
+    # The same key the conversion cache uses: source bytes plus every setting that changes the grid
+    from conversion_cache import ConversionCache
+    with open(path, "rb") as f:
+        return ConversionCache.make_key(f.read(), settings)
+
+
+def _import_job(job):
+    # Runs in batch_convert's worker processes
+    import batch_convert
+
+    path, key = job
+    try:
+        return path, key, batch_convert._worker_converter.convert(path).indices, None
+    except Exception as e:
+        return path, key, None, str(e)
+
+
+class FlagLibrary:
+    def __init__(self, path=DEFAULT_DB, converter=None):
+        self.path = path
+        self._converter = converter
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        new_sources = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'sources'").fetchone() is None
+        self.db.executescript(SCHEMA)
+        if new_sources:
+            # Libraries from before the sources table only know the sources of inserted rows
+            with self.db:
+                self.db.execute("INSERT OR IGNORE INTO sources (source_hash, flag_id) "
+                                "SELECT source_hash, id FROM flags WHERE source_hash IS NOT NULL")
+
+    @property
+    def converter(self):
+        if self._converter is None:
+            from png_converter import PixelGridConverter
+            self._converter = PixelGridConverter(verbose=False)
+        return self._converter
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def row_values(self, name, indices, source_hash=None):
+        converter = self.converter
+        grid = converter.serialize_indices(indices)
+        preview = converter.palette_preview(indices)
+        phash = dhash(converter.palette_rgb[indices])
+        thumbnail = io.BytesIO()
+        preview.save(thumbnail, "PNG", optimize=True)
+        return (name, source_hash, hashlib.sha256(grid).hexdigest(), to_signed(phash), *bands(phash),
+                indices.shape[1], indices.shape[0], zlib.compress(np.ascontiguousarray(indices, np.uint8).tobytes()),
+                zlib.compress(bytes(grid), 6), thumbnail.getvalue(), time.time())
+
+    def _insert(self, values, tags=()):
+        # Returns (id, inserted); an identical grid already in the library is reused
+        existing = self.db.execute("SELECT id FROM flags WHERE grid_hash = ?", (values[2],)).fetchone()
+        if existing is not None:
+            flag_id, inserted = existing[0], False
+        else:
+            columns = ["name", "source_hash", "grid_hash", "phash", *(f"band{i}" for i in range(BANDS)),
+                       "width", "height", "indices", "grid", "thumbnail", "created"]
+            cursor = self.db.execute(f"INSERT INTO flags ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                     values)
+            flag_id, inserted = cursor.lastrowid, True
+        if values[1] is not None:
+            self.db.execute("INSERT OR IGNORE INTO sources (source_hash, flag_id) VALUES (?, ?)", (values[1], flag_id))
+        if tags:
+            self.db.executemany("INSERT OR IGNORE INTO tags (tag, flag_id) VALUES (?, ?)",
+                                [(tag, flag_id) for tag in tags])
+        return flag_id, inserted
+
+    def add(self, name, indices, source_hash=None, tags=()):
+        with self.db:
+            return self._insert(self.row_values(name, np.asarray(indices, dtype=np.uint8), source_hash), tags)
+
+    def known_source(self, source_hash):
+        row = self.db.execute("SELECT flag_id FROM sources WHERE source_hash = ?", (source_hash,)).fetchone()
+        return row[0] if row else None
+
+    def import_paths(self, specs, tags=(), workers=None, converter_options=None):
+        # Images are converted across worker processes, grid text and .reg exports are decoded here.
+        # Everything is written in one transaction
+        from batch_convert import _init_worker, collect_inputs, is_image_file
+        from grid_decoder import GridDecodeError, read_grid_sources
+
+        summary = {"added": 0, "duplicates": 0, "known": 0, "failed": 0}
+        paths = []
+        for spec in specs:
+            if os.path.isfile(spec) and spec.lower().endswith(GRID_EXTENSIONS):
+                paths.append(spec)
+            elif os.path.isdir(spec):
+                paths.extend(os.path.join(spec, name) for name in sorted(os.listdir(spec))
+                             if name.lower().endswith(GRID_EXTENSIONS))
+        # collect_inputs takes any file named directly, grids are decoded above and not converted
+        images = [path for path in collect_inputs(specs)
+                  if is_image_file(path) and not path.lower().endswith(GRID_EXTENSIONS)]
+
+        def record(name, indices, source_hash=None):
+            _, inserted = self._insert(self.row_values(name, indices, source_hash), tags)
+            summary["added" if inserted else "duplicates"] += 1
+
+        converter_options = converter_options or {}
+        if converter_options:
+            from png_converter import PixelGridConverter
+            settings = PixelGridConverter(verbose=False, **converter_options).settings_key(True)
+        else:
+            settings = self.converter.settings_key(True)
+
+        # Sources imported before with the same settings are skipped before any conversion
+        jobs = []
+        for path in images:
+            try:
+                key = source_key(path, settings)
+            except OSError as e:
+                summary["failed"] += 1
+                print(f"FAILED {path}: {e}")
+                continue
+            if self.known_source(key):
+                summary["known"] += 1
+            else:
+                jobs.append((path, key))
+        images = jobs
+
+        workers = max(1, min(workers or os.cpu_count() or 1, len(images) or 1))
+        if workers == 1:
+            _init_worker(converter_options)
+            results = map(_import_job, images)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(converter_options,))
+            results = executor.map(_import_job, images, chunksize=max(1, len(images) // (workers * 8)))
+
+        try:
+            with self.db:
+                for path in paths:
+                    try:
+                        sources = read_grid_sources(path)
+                        for value_name, grid_data in sources:
+                            name = value_name or os.path.splitext(os.path.basename(path))[0]
+                            record(name, self.converter.decode_grid_data(grid_data).indices)
+                    except (OSError, GridDecodeError) as e:
+                        summary["failed"] += 1
+                        print(f"FAILED {path}: {e}")
+
+                for path, key, indices, error in results:
+                    if error:
+                        summary["failed"] += 1
+                        print(f"FAILED {path}: {error}")
+                    else:
+                        record(os.path.splitext(os.path.basename(path))[0], indices, key)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return summary
+
+    def find(self, name=None, tag=None, limit=None):
+        # name matches as a prefix, both use an index
+        query = "SELECT id, name, width, height, created FROM flags"
+        where, params = [], []
+        if name:
+            where.append("name >= ? AND name < ?")
+            params += [name, name + "\uffff"]
+        if tag:
+            where.append("id IN (SELECT flag_id FROM tags WHERE tag = ?)")
+            params.append(tag)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY name, id"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.db.execute(query, params)]
+
+    def get(self, flag_id):
+        row = self.db.execute("SELECT * FROM flags WHERE id = ?", (flag_id,)).fetchone()
+        if row is None:
+            return None
+        flag = dict(row)
+        flag["indices"] = np.frombuffer(zlib.decompress(flag["indices"]), dtype=np.uint8).reshape(
+            flag["height"], flag["width"])
+        flag["grid"] = zlib.decompress(flag["grid"]).decode("utf-8")
+        flag["phash"] &= (1 << 64) - 1
+        flag["tags"] = self.tags(flag_id)
+        return flag
+
+    def tags(self, flag_id):
+        return [row[0] for row in self.db.execute("SELECT tag FROM tags WHERE flag_id = ? ORDER BY tag", (flag_id,))]
+
+    def tag(self, flag_id, *tags):
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO tags (tag, flag_id) VALUES (?, ?)",
+                                [(tag, flag_id) for tag in tags])
+
+    def untag(self, flag_id, *tags):
+        with self.db:
+            self.db.executemany("DELETE FROM tags WHERE tag = ? AND flag_id = ?", [(tag, flag_id) for tag in tags])
+
+    def remove(self, flag_id):
+        with self.db:
+            self.db.execute("DELETE FROM flags WHERE id = ?", (flag_id,))
+
+    def similar(self, phash, max_distance=NEAR_DISTANCE, exclude=None):
+        # Candidates share at least one band (each lookup is indexed), then the exact distance decides.
+        # Past BANDS - 1 bits a match may share no band, so every flag is compared instead
+        if max_distance < BANDS:
+            query = " UNION ".join(f"SELECT id, name, phash FROM flags WHERE band{i} = ?" for i in range(BANDS))
+            params = bands(phash)
+        else:
+            query, params = "SELECT id, name, phash FROM flags", ()
+        matches = []
+        for flag_id, name, other in self.db.execute(query, params):
+            distance = hamming(phash, other)
+            if flag_id != exclude and distance <= max_distance:
+                matches.append({"id": flag_id, "name": name, "distance": distance})
+        return sorted(matches, key=lambda match: (match["distance"], match["id"]))
+
+    def similar_to_image(self, path, max_distance=NEAR_DISTANCE):
+        indices = self.converter.convert(path).indices
+        return self.similar(dhash(self.converter.palette_rgb[indices]), max_distance)
+
+    def near_duplicates(self, max_distance=NEAR_DISTANCE):
+        # Pairs (id, id, distance), found with one indexed self-join per band
+        pairs = {}
+        if max_distance >= BANDS:
+            # Too far apart for the bands to find every pair, all of them are compared
+            flags = self.db.execute("SELECT id, phash FROM flags ORDER BY id").fetchall()
+            for n, (a, phash_a) in enumerate(flags):
+                for b, phash_b in flags[n + 1:]:
+                    distance = hamming(phash_a, phash_b)
+                    if distance <= max_distance:
+                        pairs[(a, b)] = distance
+            return sorted((a, b, distance) for (a, b), distance in pairs.items())
+
+        for i in range(BANDS):
+            query = (f"SELECT a.id, b.id, a.phash, b.phash FROM flags a JOIN flags b "
+                     f"ON a.band{i} = b.band{i} AND a.id < b.id")
+            for a, b, phash_a, phash_b in self.db.execute(query):
+                if (a, b) not in pairs:
+                    distance = hamming(phash_a, phash_b)
+                    if distance <= max_distance:
+                        pairs[(a, b)] = distance
+        return sorted((a, b, distance) for (a, b), distance in pairs.items())
+
+    def export(self, folder, name=None, tag=None, previews=False):
+        os.makedirs(folder, exist_ok=True)
+        written = []
+        used = set()
+        for entry in self.find(name, tag):
+            row = self.db.execute("SELECT grid, thumbnail FROM flags WHERE id = ?", (entry["id"],)).fetchone()
+            stem = "".join(c if c.isalnum() or c in "-_." else "_" for c in entry["name"]) or "flag"
+            if stem in used:
+                stem = f"{stem}_{entry['id']}"
+            used.add(stem)
+            output_path = os.path.join(folder, stem + ".txt")
+            with open(output_path, "wb") as f:
+                f.write(zlib.decompress(row["grid"]))
+            if previews:
+                with open(os.path.join(folder, stem + ".png"), "wb") as f:
+                    f.write(row["thumbnail"])
+            written.append(output_path)
+        return written
+
+
+def print_usage():
+    print("Usage: python flag_library.py [--db flags.db] <command> ...")
+    print("       import <images|grids|dirs|globs|@manifest> ... [--tag TAG] [--workers N]")
+    print("       list [--name PREFIX] [--tag TAG] [--limit N]")
+    print("       similar <id|image> [--distance N]")
+    print("       dupes [--distance N]")
+    print("       tag <id> <tag> ...")
+    print("       export <folder> [--name PREFIX] [--tag TAG] [--previews]")
+
+
+def main():
+    args = sys.argv[1:]
+    db_path = DEFAULT_DB
+    if len(args) >= 2 and args[0] == "--db":
+        db_path = args[1]
+        args = args[2:]
+    if not args:
+        print_usage()
+        return 1
+
+    command, rest = args[0], args[1:]
+    options = {"--tag": None, "--name": None, "--workers": None, "--distance": str(NEAR_DISTANCE), "--limit": None}
+    positional = []
+    previews = False
+    i = 0
+    while i < len(rest):
+        if rest[i] in options and i + 1 < len(rest):
+            options[rest[i]] = rest[i + 1]
+            i += 1
+        elif rest[i] == "--previews":
+            previews = True
+        else:
+            positional.append(rest[i])
+        i += 1
+    distance = int(options["--distance"])
+
+    with FlagLibrary(db_path) as library:
+        if command == "import" and positional:
+            tags = [options["--tag"]] if options["--tag"] else []
+            workers = int(options["--workers"]) if options["--workers"] else None
+            start = time.perf_counter()
+            summary = library.import_paths(positional, tags, workers)
+            print(f"Added {summary['added']}, {summary['duplicates']} identical grids and {summary['known']} known "
+                  f"sources skipped, {summary['failed']} failed in {time.perf_counter() - start:.2f}s")
+            return 1 if summary["failed"] else 0
+        if command == "list":
+            for flag in library.find(options["--name"], options["--tag"], options["--limit"]):
+                print(f"{flag['id']:>6}  {flag['name']}  ({flag['width']}x{flag['height']})")
+            return 0
+        if command == "similar" and positional:
+            target = positional[0]
+            if target.isdigit():
+                flag = library.get(int(target))
+                if flag is None:
+                    print(f"No flag with id {target}")
+                    return 1
+                matches = library.similar(flag["phash"], distance, exclude=flag["id"])
+            else:
+                matches = library.similar_to_image(target, distance)
+            for match in matches:
+                print(f"{match['id']:>6}  {match['name']}  (distance {match['distance']})")
+            return 0
+        if command == "dupes":
+            for a, b, d in library.near_duplicates(distance):
+                print(f"{a:>6} ~ {b:<6} distance {d}")
+            return 0
+        if command == "tag" and len(positional) >= 2:
+            library.tag(int(positional[0]), *positional[1:])
+            return 0
+        if command == "export" and positional:
+            written = library.export(positional[0], options["--name"], options["--tag"], previews)
+            print(f"Exported {len(written)} flags to {positional[0]}")
+            return 0
+
+    print_usage()
+    return 1
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(SCRIPT_DIR, "golden")
+IMAGE_DIR = os.path.join(GOLDEN_DIR, "images")
+EXPECTED_FILE = os.path.join(GOLDEN_DIR, "expected.json")
+
+# name -> (converter options, preserve_colors, encoding). Every corpus image is checked with each
+CONFIGS = {
+    "default": ({}, True, "text"),
+    "binary": ({}, True, "binary"),
+    "clustering": ({}, False, "text"),
+    "lab": ({"color_mode": "lab"}, True, "text"),
+    "floyd-steinberg": ({"dither": "floyd-steinberg"}, True, "text"),
+    "bayer-lab": ({"dither": "bayer", "dither_space": "lab"}, True, "text"),
+    "area": ({"resample": "area"}, True, "text"),
+    "lanczos": ({"resample": "lanczos"}, True, "text"),
+}
+
+# A case only counts as slower when it is both this much slower and over the noise floor
+SLOWDOWN = 1.5
+NOISE_FLOOR_MS = 1.0
+
+
+def make_corpus(image_dir=IMAGE_DIR):
+    # Written once and committed, the images themselves are the reference, not this code
+    import numpy as np
+    from PIL import Image
+    from palette import load_palette
+
+    os.makedirs(image_dir, exist_ok=True)
+    rng = np.random.default_rng(2024)
+
+    x = np.linspace(0, 1, 300)[None, :]
+    y = np.linspace(0, 1, 200)[:, None]
+    gradient = np.stack([255 * x + 0 * y, 255 * y + 0 * x, 255 * (1 - (x + y) / 2)], axis=-1)
+    Image.fromarray(gradient.astype(np.uint8), "RGB").save(os.path.join(image_dir, "gradient.png"))
+
+    Image.fromarray(rng.integers(0, 256, (120, 160, 3), dtype=np.uint8), "RGB").save(os.path.join(image_dir, "noise.png"))
+
+    alpha = Image.fromarray(gradient[:160, :240].astype(np.uint8), "RGB").convert("RGBA")
+    alpha.putalpha(Image.fromarray(np.linspace(0, 255, 240, dtype=np.float32)[None, :].repeat(160, axis=0)
+                                   .astype(np.uint8), "L"))
+    alpha.save(os.path.join(image_dir, "alpha.png"))
+
+    # Exact game colors in blocks, every cell has one right answer
+    palette = load_palette()
+    blocks = np.arange(len(palette), dtype=np.uint8).reshape(6, 7).repeat(22, axis=0).repeat(28, axis=1)
+    indexed = Image.fromarray(blocks, "P")
+    indexed.putpalette(palette.pil_palette)
+    indexed.save(os.path.join(image_dir, "palette.png"))
+
+    # Smaller than the grid, so every filter has to upscale
+    checks = ((np.indices((30, 40)).sum(axis=0) % 2) * 200 + 30).astype(np.uint8)
+    Image.fromarray(np.stack([checks, checks[::-1], 255 - checks], axis=-1), "RGB").save(os.path.join(image_dir, "small.png"))
+
+    # Thin lines that nearest sampling drops or keeps depending on where they fall
+    lines = np.full((400, 66), 230, dtype=np.uint8)
+    lines[::7] = 20
+    lines[:, ::5] = 90
+    Image.fromarray(lines, "L").save(os.path.join(image_dir, "lines.png"))
+
+
+def corpus_images():
+    return sorted(name for name in os.listdir(IMAGE_DIR) if name.lower().endswith(".png"))
+
+
+def digest(data):
+    return hashlib.sha256(bytes(data)).hexdigest()
+
+
+def time_case(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def case_runners():
+    from png_converter import PixelGridConverter
+
+    runners = {}
+    for config, (options, preserve_colors, encoding) in CONFIGS.items():
+        converter = PixelGridConverter(verbose=False, **options)
+        for name in corpus_images():
+            path = os.path.join(IMAGE_DIR, name)
+            runners[f"{name} {config}"] = (lambda converter=converter, path=path, preserve_colors=preserve_colors,
+                                           encoding=encoding: converter.convert(path, preserve_colors).grid_bytes(encoding))
+    return runners
+
+
+def run_cases(runners, repeat):
+    results = {}
+    for case, run in runners.items():
+        # The first call pays for lookup tables and weights, only later ones are timed
+        run()
+        data, ms = time_case(run, repeat)
+        results[case] = {"sha256": digest(data), "min_ms": ms}
+    return results
+
+
+def check_end_to_end(expected):
+    # convert_png_to_pixel_grid with file and registry output, against fake_winreg
+    import fake_winreg
+    import registry_backend
+    from png_converter import PixelGridConverter
+
+    failures = []
+    fake_winreg.install()
+    saved_env = os.environ.pop(registry_backend.REGISTRY_FILE_ENV, None)
+    registry_backend._default_index = None
+    try:
+        with fake_winreg.CreateKey(fake_winreg.HKEY_CURRENT_USER, registry_backend.UNITY_EDITOR_PATH + r"\jrsjams\MageArena"):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for binary in (False, True):
+                config = "binary" if binary else "default"
+                for name in corpus_images():
+                    case = f"{name} {config}"
+                    converter = PixelGridConverter(verbose=False)
+                    key_name = "flagGrid_" + os.path.splitext(name)[0]
+                    output_file = os.path.join(tmp, f"{case}.txt")
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            grid_data = converter.convert_png_to_pixel_grid(os.path.join(IMAGE_DIR, name),
+                                                                            output_file=output_file, binary=binary)
+                            # The path and name are per call, so write again under this image's own value name
+                            converter.save_to_unity_registry(grid_data, binary, key_name=key_name)
+                            unchanged = not converter.save_to_unity_registry(grid_data, binary, key_name=key_name)
+
+                        with open(output_file, "rb") as f:
+                            file_hash = digest(f.read())
+                        with fake_winreg.OpenKey(fake_winreg.HKEY_CURRENT_USER, converter.unity_registry_path) as key:
+                            value, value_type = fake_winreg.QueryValueEx(key, key_name)
+                    except Exception as e:
+                        failures.append(f"{case}: {e}")
+                        continue
+                    stored = value.encode("utf-8") if value_type == fake_winreg.REG_SZ else value
+
+                    want = expected.get(case, {}).get("sha256")
+                    if file_hash != want:
+                        failures.append(f"{case}: file output differs from the golden grid")
+                    if digest(stored) != want:
+                        failures.append(f"{case}: registry value differs from the golden grid")
+                    if value_type != (fake_winreg.REG_BINARY if binary else fake_winreg.REG_SZ):
+                        failures.append(f"{case}: registry value has type {value_type}")
+                    if not unchanged:
+                        failures.append(f"{case}: saving the same flag twice wrote it again")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            companies = PixelGridConverter(verbose=False).find_unity_registry_keys()
+        if companies != ["jrsjams"]:
+            failures.append(f"find_unity_registry_keys returned {companies}")
+    finally:
+        registry_backend._default_index = None
+        sys.modules.pop("winreg", None)
+        if saved_env is not None:
+            os.environ[registry_backend.REGISTRY_FILE_ENV] = saved_env
+    return failures
+
+
+def check_sources(expected):
+    # Paths, bytes and open files give the same grid, with and without a cache
+    from conversion_cache import ConversionCache
+    from png_converter import PixelGridConverter
+
+    failures = []
+    for name in corpus_images():
+        want = expected.get(f"{name} default", {}).get("sha256")
+        path = os.path.join(IMAGE_DIR, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        for cached in (False, True):
+            converter = PixelGridConverter(verbose=False, cache=ConversionCache() if cached else None)
+            sources = {"path": lambda: path, "bytes": lambda: data, "file": lambda: io.BytesIO(data)}
+            # Twice each, the second conversion comes from the cache when there is one
+            for kind, source in list(sources.items()) * 2:
+                label = f"{name} {kind} source{' with cache' if cached else ''}"
+                try:
+                    grid = converter.convert(source()).grid_bytes()
+                except Exception as e:
+                    failures.append(f"{label}: {type(e).__name__}: {e}")
+                    continue
+                if digest(grid) != want:
+                    failures.append(f"{label}: output differs from the golden grid")
+    return failures
+
+
+def check_watch_folder(expected):
+    # Folder events as inotify reports them, a new folder together with the files inside it
+    import shutil
+    from png_converter import PixelGridConverter
+    from watch_folder import FolderWatcher
+
+    failures = []
+    name = corpus_images()[0]
+    want = expected.get(f"{name} default", {}).get("sha256")
+    settings = PixelGridConverter(verbose=False).settings_key(True)
+
+    def expect(case, summary, **counts):
+        got = {key: summary[key] for key in counts}
+        if got != counts:
+            failures.append(f"watch {case}: {got}, expected {counts}")
+
+    with tempfile.TemporaryDirectory() as root:
+        watcher = FolderWatcher([root], settings, workers=1)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                folder = os.path.join(root, "new")
+                os.mkdir(folder)
+                first = os.path.join(folder, "b.png")
+                shutil.copyfile(os.path.join(IMAGE_DIR, name), first)
+                expect("new folder", watcher.changed({folder, first}), converted=1, copied=0, failed=0)
+
+                copies = [os.path.join(root, "c.png"), os.path.join(folder, "d.png")]
+                for path in copies:
+                    shutil.copyfile(first, path)
+                expect("copies", watcher.changed(set(copies)), converted=0, copied=2, failed=0)
+
+                # Only the mtime changes, so nothing is converted or copied again
+                for path in [first] + copies:
+                    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+                expect("touched", watcher.changed({first, *copies}), converted=0, copied=0, unchanged=3)
+        finally:
+            watcher.close()
+
+        for path in [first] + copies:
+            with open(os.path.splitext(path)[0] + ".txt", "rb") as f:
+                if digest(f.read()) != want:
+                    failures.append(f"watch {os.path.basename(path)}: output differs from the golden grid")
+    return failures
+
+
+def is_slower(ms, baseline_ms, slowdown):
+    return ms > baseline_ms * slowdown and ms - baseline_ms > NOISE_FLOOR_MS
+
+
+def print_usage():
+    print("Usage: python golden_check.py [--repeat N] [--no-timing] [--slowdown 1.5]")
+    print("       python golden_check.py --update  (accept the current output and timings as the reference)")
+    print("       python golden_check.py --make-corpus  (rewrite the images in golden/images)")
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 5
+    timing = True
+    update = False
+    slowdown = SLOWDOWN
+
+    i = 0
+    try:
+        while i < len(args):
+            arg = args[i]
+            if arg == "--repeat":
+                repeat = int(args[i + 1])
+                i += 1
+            elif arg == "--slowdown":
+                slowdown = float(args[i + 1])
+                i += 1
+            elif arg == "--no-timing":
+                timing = False
+            elif arg == "--update":
+                update = True
+            elif arg == "--make-corpus":
+                make_corpus()
+                print(f"Corpus written to {IMAGE_DIR}, run --update to record its output")
+                return 0
+            else:
+                print_usage()
+                return 1
+            i += 1
+    except (IndexError, ValueError):
+        print(f"Missing or invalid value for {args[i]}")
+        return 1
+
+    sys.path.insert(0, SCRIPT_DIR)
+    start = time.perf_counter()
+    runners = case_runners()
+    results = run_cases(runners, repeat if timing or update else 1)
+    elapsed = time.perf_counter() - start
+
+    if update:
+        with open(EXPECTED_FILE, "w") as f:
+            json.dump({"cases": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Recorded {len(results)} cases in {EXPECTED_FILE}")
+        return 0
+
+    try:
+        with open(EXPECTED_FILE, "r") as f:
+            expected = json.load(f)["cases"]
+    except FileNotFoundError:
+        print(f"No {EXPECTED_FILE} yet, run with --update first")
+        return 1
+
+    failures = []
+    slower = []
+    for case, result in results.items():
+        want = expected.get(case)
+        if want is None:
+            failures.append(f"{case}: no golden output recorded")
+        elif result["sha256"] != want["sha256"]:
+            failures.append(f"{case}: output changed ({result['sha256'][:12]} != {want['sha256'][:12]})")
+        elif timing and is_slower(result["min_ms"], want["min_ms"], slowdown):
+            # One busy moment shouldn't fail the run, so slow cases get a second, longer try
+            _, ms = time_case(runners[case], repeat * 3)
+            result["min_ms"] = min(result["min_ms"], ms)
+            if is_slower(result["min_ms"], want["min_ms"], slowdown):
+                slower.append(f"{case}: {result['min_ms']:.2f} ms, was {want['min_ms']:.2f} ms")
+    for case in expected:
+        if case not in results:
+            failures.append(f"{case}: golden case no longer produced")
+    failures.extend(check_end_to_end(expected))
+    failures.extend(check_sources(expected))
+    failures.extend(check_watch_folder(expected))
+
+    total_ms = sum(result["min_ms"] for result in results.values())
+    print(f"{len(results)} cases over {len(corpus_images())} images in {elapsed:.2f}s")
+    if timing:
+        print(f"Best-of-{repeat} total {total_ms:.1f} ms ({len(results) / total_ms * 1000:.1f} conversions/s)")
+    for line in failures:
+        print(f"FAIL {line}")
+    for line in slower:
+        print(f"SLOW {line}")
+    if failures or slower:
+        return 1
+    print("All golden outputs match" + (" and no case got slower" if timing else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
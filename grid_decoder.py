@@ -0,0 +1,126 @@
+import codecs
+import re
+
+import numpy as np
+
+# Anything far past the longest valid grid is rejected before it is parsed
+MAX_CELL_BYTES = 32
+
+_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+
+
+class GridDecodeError(ValueError):
+    pass
+
+
+class GridDecoder:
+    def __init__(self, uv_table, grid_width=100, grid_height=66):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cell_count = grid_width * grid_height
+
+        encoded = [uv.encode("ascii") for uv in uv_table]
+        self.key_width = max(len(uv) for uv in encoded)
+        if self.key_width > 16:
+            raise ValueError("UV values longer than 16 bytes are not supported")
+
+        low, high = self._split_keys([uv.ljust(16, b"\0") for uv in encoded])
+        hashes = self._hash(low, high)
+        if len(np.unique(hashes)) != len(hashes):
+            raise ValueError("UV table contains duplicate values")
+        self.hash_order = np.argsort(hashes)
+        self.sorted_hashes = hashes[self.hash_order]
+        self.sorted_low = low[self.hash_order]
+        self.sorted_high = high[self.hash_order]
+        self.sorted_lengths = np.array([len(uv) for uv in encoded])[self.hash_order]
+
+    @staticmethod
+    def _split_keys(keys):
+        words = np.frombuffer(b"".join(keys), dtype="<u8").reshape(-1, 2)
+        return words[:, 0].copy(), words[:, 1].copy()
+
+    @staticmethod
+    def _hash(low, high):
+        return low ^ (high * np.uint64(0x9E3779B97F4A7C15))
+
+    def decode(self, grid_data):
+        if isinstance(grid_data, str):
+            grid_data = grid_data.encode("utf-8", "replace")
+        # The binary PlayerPrefs form is null terminated
+        grid_data = bytes(grid_data).strip().rstrip(b"\0").strip()
+
+        if len(grid_data) > self.cell_count * MAX_CELL_BYTES:
+            raise GridDecodeError(f"Grid data is {len(grid_data)} bytes, too long for {self.cell_count} cells")
+        if not grid_data:
+            raise GridDecodeError("Grid data is empty")
+
+        buffer = np.frombuffer(grid_data, dtype=np.uint8)
+        commas = np.flatnonzero(buffer == ord(","))
+        if len(commas) + 1 != self.cell_count:
+            raise GridDecodeError(f"Expected {self.cell_count} cells "
+                                  f"({self.grid_width}x{self.grid_height}), found {len(commas) + 1}")
+
+        starts = np.concatenate(([0], commas + 1))
+        lengths = np.concatenate((commas, [len(buffer)])) - starts
+
+        # Read every cell as two little-endian words straight out of the buffer, masked to its length
+        padded = np.zeros(len(buffer) + 24, dtype=np.uint8)
+        padded[:len(buffer)] = buffer
+        words = np.ndarray(shape=(8, len(padded) // 8 - 1), dtype="<u8", buffer=padded, strides=(1, 8))
+        low = words[starts % 8, starts // 8] & _MASKS[np.minimum(lengths, 8)]
+        high = words[starts % 8, starts // 8 + 1] & _MASKS[np.clip(lengths - 8, 0, 8)]
+
+        found = np.minimum(np.searchsorted(self.sorted_hashes, self._hash(low, high)), len(self.sorted_hashes) - 1)
+        unknown = ((self.sorted_low[found] != low) | (self.sorted_high[found] != high)
+                   | (self.sorted_lengths[found] != lengths))
+        if unknown.any():
+            bad = np.flatnonzero(unknown)
+            samples = ", ".join(
+                f"#{i}: '{grid_data[starts[i]:starts[i] + min(lengths[i], MAX_CELL_BYTES)].decode('utf-8', 'replace')}'"
+                for i in bad[:5]
+            )
+            raise GridDecodeError(f"{len(bad)} unknown UV value(s), first ones {samples}")
+
+        flat = self.hash_order[found].astype(np.uint8)
+        # Undo the column-major, bottom-up order the game uses
+        return flat.reshape(self.grid_width, self.grid_height).T[::-1].copy()
+
+
+def _reg_text(raw):
+    if raw.startswith(codecs.BOM_UTF16_LE) or raw.startswith(codecs.BOM_UTF16_BE):
+        return raw.decode("utf-16")
+    return raw.decode("utf-8-sig", "replace")
+
+
+def parse_reg_file(raw, prefix="flagGrid_"):
+    # regedit exports: "name"="string" or "name"=hex:30,2e,... with \ line continuations
+    text = re.sub(r"\\\r?\n\s*", "", _reg_text(raw))
+    values = []
+    for line in text.splitlines():
+        match = re.match(r'^"((?:[^"\\]|\\.)*)"=(.*)$', line.strip())
+        if not match:
+            continue
+        name, value = match.group(1).replace('\\"', '"').replace("\\\\", "\\"), match.group(2)
+        if prefix and not name.startswith(prefix):
+            continue
+        if value.startswith('"') and value.endswith('"'):
+            values.append((name, value[1:-1].replace('\\"', '"').replace("\\\\", "\\")))
+        elif value.startswith("hex:"):
+            try:
+                values.append((name, bytes(int(part, 16) for part in value[4:].split(",") if part.strip())))
+            except ValueError:
+                raise GridDecodeError(f"Malformed hex data for registry value {name}")
+    return values
+
+
+def read_grid_sources(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    if path.lower().endswith(".reg"):
+        values = parse_reg_file(raw)
+        if not values:
+            raise GridDecodeError(f"No flagGrid_ values found in {path}")
+        return values
+
+    return [(None, raw)]
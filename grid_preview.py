@@ -0,0 +1,40 @@
+import numpy as np
+from PIL import Image
+
+ZOOM_LEVELS = (1, 2, 3, 4, 6, 8)
+
+
+class GridPreview:
+    # Renders palette indices straight to pixels through the palette as a lookup table. Buffers
+    # are kept per grid size and zoom, so after the first render nothing new is allocated
+    def __init__(self):
+        self.luts = {}
+        self.buffers = {}
+
+    def lut(self, palette):
+        # RGBA, because Pillow can only share memory with a numpy buffer in 4-byte modes
+        lut = self.luts.get(palette.digest)
+        if lut is None:
+            lut = np.full((len(palette), 4), 255, dtype=np.uint8)
+            lut[:, :3] = palette.rgb
+            self.luts[palette.digest] = lut
+        return lut
+
+    def buffer(self, height, width, zoom):
+        entry = self.buffers.get((height, width, zoom))
+        if entry is None:
+            cells = np.empty((height, width, 4), dtype=np.uint8)
+            pixels = np.empty((height * zoom, width * zoom, 4), dtype=np.uint8)
+            # The image is a view of pixels, so writing pixels updates it
+            image = Image.frombuffer("RGBA", (width * zoom, height * zoom), pixels, "raw", "RGBA", 0, 1)
+            entry = (cells, pixels, image)
+            self.buffers[(height, width, zoom)] = entry
+        return entry
+
+    def render(self, indices, palette, zoom=1):
+        height, width = indices.shape
+        cells, pixels, image = self.buffer(height, width, zoom)
+        np.take(self.lut(palette), indices, axis=0, out=cells)
+        # Every cell becomes a zoom x zoom block, written in place through a strided view
+        pixels.reshape(height, zoom, width, zoom, 4)[...] = cells[:, None, :, None, :]
+        return image
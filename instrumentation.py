@@ -0,0 +1,82 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class Instrumentation:
+    def __init__(self, hooks=None, trace_memory=False):
+        self.hooks = list(hooks or [])
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+
+    def message(self, text):
+        self.emit({"event": "message", "message": text})
+
+    @contextmanager
+    def stage(self, name, message=None, **info):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        event = {"event": "stage_start", "stage": name, **info}
+        if message:
+            event["message"] = message
+        self.emit(event)
+
+        status = "ok"
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            record = {
+                "stage": name,
+                "status": status,
+                "wall_ms": (time.perf_counter() - wall_start) * 1000,
+                "cpu_ms": (time.thread_time() - cpu_start) * 1000,
+                **info,
+            }
+            if self.trace_memory:
+                record["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+            self.emit({"event": "stage_end", **record})
+
+    def summary(self):
+        return {
+            "wall_ms": sum(stage["wall_ms"] for stage in self.stages),
+            "cpu_ms": sum(stage["cpu_ms"] for stage in self.stages),
+            "stages": list(self.stages),
+        }
+
+    def to_json(self, **extra):
+        return json.dumps({**extra, **self.summary()}, indent=2)
+
+
+def print_hook(event):
+    if "message" in event:
+        print(event["message"])
+
+
+def cancel_hook(event):
+    # Stops a running conversion at its next stage once the threading.Event is set
+    def hook(record):
+        if record["event"] == "stage_start" and event.is_set():
+            raise ConversionCancelled()
+    return hook
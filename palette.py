@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+PALETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "palettes")
+DEFAULT_PALETTE = "magearena"
+PALETTE_EXTENSIONS = (".json", ".toml")
+
+
+def hex_to_rgb(hex_str):
+    hex_str = hex_str.lstrip("#")
+    return (int(hex_str[0:2], 16), int(hex_str[2:4], 16), int(hex_str[4:6], 16))
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class Palette:
+    # The game colors compiled once into the arrays every stage works from. Instances are
+    # shared between converters and threads, so nothing here changes after construction
+    def __init__(self, name, colors, description=""):
+        if not colors:
+            raise ValueError(f"Palette '{name}' has no colors")
+        if len(colors) > 256:
+            raise ValueError(f"Palette '{name}' has {len(colors)} colors, at most 256 fit in a grid cell index")
+
+        self.name = name
+        self.description = description
+        self.hex = [hex_str.upper().lstrip("#") for hex_str, _, _ in colors]
+        self.uv = [uv for _, uv, _ in colors]
+        self.labels = [label for _, _, label in colors]
+        if len(set(self.uv)) != len(self.uv):
+            raise ValueError(f"Palette '{name}' has duplicate UV values")
+
+        self.rgb = _read_only(np.array([hex_to_rgb(hex_str) for hex_str in self.hex], dtype=np.uint8))
+        from color_lut import rgb_to_lab
+        self.lab = _read_only(rgb_to_lab(self.rgb).astype(np.float32))
+        self.uv_table = _read_only(np.array(self.uv))
+        self.pil_palette = self.rgb.tobytes()
+        # rgb -> index for Pillow's padded palettes, uv -> index for decoding
+        self.rgb_index = {tuple(rgb): i for i, rgb in enumerate(self.rgb.tolist())}
+        self.uv_index = {uv: i for i, uv in enumerate(self.uv)}
+        self.digest = hashlib.blake2b(self.pil_palette + "\0".join(self.uv).encode("utf-8"), digest_size=16).hexdigest()
+
+        self.image = Image.new("P", (16, 16))
+        self.image.putpalette(self.pil_palette)
+        self._serializer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.uv)
+
+    def __repr__(self):
+        return f"Palette({self.name!r}, {len(self)} colors)"
+
+    def serializer(self):
+        # Only depends on the UV strings, so one per palette serves every converter
+        with self._lock:
+            if self._serializer is None:
+                from playerprefs import GridSerializer
+                self._serializer = GridSerializer(self.uv)
+            return self._serializer
+
+    @classmethod
+    def from_mapping(cls, name, color_map, description=""):
+        # {"C17171": "0.0:0.9", ...}, the form pixel_color_map has always had
+        return cls(name, [(hex_str, uv, "") for hex_str, uv in color_map.items()], description)
+
+    @classmethod
+    def from_file(cls, path):
+        if path.lower().endswith(".toml"):
+            import tomllib
+            with open(path, "rb") as f:
+                raw = tomllib.load(f)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+
+        name = raw.get("name") or os.path.splitext(os.path.basename(path))[0]
+        try:
+            colors = [(color["hex"], color["uv"], color.get("name", "")) for color in raw["colors"]]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Palette file {path} is missing {e}, expected colors with hex and uv")
+        return cls(name, colors, raw.get("description", ""))
+
+
+def palette_path(name):
+    for extension in PALETTE_EXTENSIONS:
+        path = os.path.join(PALETTE_DIR, name + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def available_palettes():
+    if not os.path.isdir(PALETTE_DIR):
+        return []
+    return sorted({os.path.splitext(name)[0] for name in os.listdir(PALETTE_DIR)
+                   if name.lower().endswith(PALETTE_EXTENSIONS)})
+
+
+_palettes = {}
+_palettes_lock = threading.Lock()
+
+
+def load_palette(palette=DEFAULT_PALETTE):
+    # A name from palettes/, a path to a palette file, or a Palette. Each one is compiled once
+    # per process and the same object is handed to every converter after that
+    if isinstance(palette, Palette):
+        return palette
+
+    with _palettes_lock:
+        loaded = _palettes.get(palette)
+        if loaded is None:
+            path = palette if os.path.isfile(palette) else palette_path(palette)
+            if path is None:
+                raise ValueError(f"Unknown palette '{palette}', expected one of "
+                                 f"{', '.join(available_palettes())} or a palette file")
+            loaded = Palette.from_file(path)
+            _palettes[palette] = loaded
+        return loaded
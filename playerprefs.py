@@ -0,0 +1,45 @@
+import numpy as np
+
+# Unity stores PlayerPrefs strings on Windows as REG_BINARY holding null terminated UTF-8
+TEXT = "text"
+BINARY = "binary"
+ENCODINGS = (TEXT, BINARY)
+
+
+class GridSerializer:
+    def __init__(self, uv_table):
+        # Every UV with its trailing comma, null padded to one row per palette entry
+        encoded = [uv.encode("utf-8") + b"," for uv in uv_table]
+        width = max(len(uv) for uv in encoded)
+        self.table = np.zeros((len(encoded), width), dtype=np.uint8)
+        for i, uv in enumerate(encoded):
+            self.table[i, :len(uv)] = np.frombuffer(uv, dtype=np.uint8)
+        self.lengths = np.array([len(uv) for uv in encoded])
+        self.mask = np.arange(width)[None, :] < self.lengths[:, None]
+
+    def to_buffer(self, order, encoding=TEXT):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown grid encoding '{encoding}', expected one of {', '.join(ENCODINGS)}")
+
+        order = np.asarray(order)
+        total = int(self.lengths[order].sum())
+        buffer = bytearray(total)
+        if total:
+            view = np.frombuffer(buffer, dtype=np.uint8)
+            view[:] = self.table[order][self.mask[order]]
+            # Release the export before resizing the bytearray
+            del view
+
+        if encoding == BINARY:
+            # The last separator becomes the null terminator
+            if buffer:
+                buffer[-1] = 0
+            else:
+                buffer.append(0)
+        elif buffer:
+            del buffer[-1]
+        return buffer
+
+
+def text_to_playerprefs(grid_data):
+    return grid_data.encode("utf-8") + b"\0"
@@ -1,230 +1,436 @@
+import io
+import json
+import math
 import os
 import sys
-from skimage import color
+import threading
 from PIL import Image
 import numpy as np
-import json
 
-# Seperated them by color so we can read it better
-pixel_color_map = {
-    # Row 1
-    "C17171": "0.0:0.9",    # Light red 
-    "C5A877": "0.2:0.9",    # Light orange/tan 
-    "B9B16E": "0.35:0.9",   # Light yellow/beige 
-    "97C38F": "0.5:0.9",    # Light green
-    "79BABA": "0.615:0.9",  # Light cyan 
-    "93ABCC": "0.79:0.9",   # Light blue 
-    "A96EBC": "0.98:0.9",    # Light purple 
-    
-    # Row 2 
-    "C43232": "0.0:0.75",    # Medium red 
-    "C7943C": "0.2:0.75",    # Medium orange 
-    "C3B435": "0.35:0.75",   # Medium yellow 
-    "60C34D": "0.5:0.75",    # Medium green 
-    "3AC1C0": "0.615:0.75",  # Medium cyan 
-    "5688CD": "0.79:0.75",   # Medium blue 
-    "9C34BD": "0.98:0.75",    # Medium purple 
-    
-    # Row 3
-    "C60000": "0.0:0.58",    # Dark red 
-    "C67E00": "0.2:0.58",    # Dark orange 
-    "C7B300": "0.35:0.58",   # Dark yellow 
-    "21C600": "0.5:0.58",    # Dark green 
-    "00C6C4": "0.615:0.58",  # Dark cyan 
-    "0054C6": "0.79:0.58",   # Dark blue 
-    "9200C1": "0.98:0.58",    # Dark purple 
-    
-    # Row 4 
-    "6D0000": "0.0:0.41",    # Very dark red 
-    "764C00": "0.2:0.41",    # Very dark orange 
-    "7F7200": "0.35:0.41",   # Very dark yellow 
-    "1A9700": "0.5:0.41",    # Very dark green 
-    "007B79": "0.615:0.41",  # Very dark cyan
-    "003E93": "0.79:0.41",   # Very dark blue
-    "640084": "0.98:0.41",    # Very dark purple
-
-    # Row 5
-    "300000": "0.0:0.25",    # Darkest red 
-    "462D00": "0.2:0.25",    # Darkest orange 
-    "393300": "0.35:0.25",   # Darkest yellow
-    "0B4100": "0.5:0.25",    # Darkest green 
-    "003736": "0.615:0.25",  # Darkest cyan
-    "001F4A": "0.79:0.25",   # Darkest blue 
-    "38004A": "0.98:0.25",    # Darkest purple
-
-    # Row 6
-    "FFFFFF": "0.0:0.05",    # White (lightest)
-    "DFDFDF": "0.2:0.05",    # Light gray
-    "BEBEBE": "0.35:0.05",    # Medium light gray
-    "A6A6A6": "0.5:0.05",    # Medium gray
-    "7D7D7D": "0.62:0.05",    # Medium dark gray
-    "464646": "0.77:0.05",    # Dark gray
-    "000000": "0.96:0.05",    # Black (darkest)
-}
-
-def get_rgb(hex_str):
-    return (int(hex_str[0:2], 16), int(hex_str[2:4], 16), int(hex_str[4:6], 16))
+from instrumentation import Instrumentation, print_hook
+from palette import DEFAULT_PALETTE, hex_to_rgb, load_palette
+
+# The game colors live in palettes/magearena.json, this hex -> UV view stays for scripts that read them from here
+pixel_color_map = dict(zip(load_palette().hex, load_palette().uv))
+get_rgb = hex_to_rgb
+
+COLOR_MODES = ("rgb", "lab", "ciede2000")
+
+# Sources above this many pixels are rejected before anything is decoded
+MAX_SOURCE_PIXELS = 100_000_000
+# Formats that can decode at reduced scale (JPEG) are asked for roughly this many pixels
+WORKING_PIXELS = 4_000_000
+# Colors --use-clustering reduces an image to before matching them to the palette
+CLUSTERS = 16
+
+class ConversionResult:
+    def __init__(self, converter, indices, grid_data=None, source=None, metrics=None, cached=False):
+        self.converter = converter
+        self.indices = indices
+        self.source = source
+        self.metrics = metrics if metrics is not None else Instrumentation()
+        self.cached = cached
+        self._grid_data = grid_data
+        self._preview = None
+
+    @property
+    def width(self):
+        return self.indices.shape[1]
+
+    @property
+    def height(self):
+        return self.indices.shape[0]
+
+    @property
+    def cell_count(self):
+        return self.indices.size
+
+    @property
+    def color_count(self):
+        # Distinct game colors the grid uses
+        return int(np.count_nonzero(np.bincount(self.indices.ravel(), minlength=len(self.converter.uv_table))))
+
+    @property
+    def stats(self):
+        return {stage["stage"]: stage for stage in self.metrics.stages}
+
+    @property
+    def grid_data(self):
+        if self._grid_data is None:
+            with self.metrics.stage("serialize", "Serializing grid data"):
+                self._grid_data = self.converter.serialize_indices(self.indices).decode("utf-8")
+        return self._grid_data
+
+    def grid_bytes(self, encoding="text"):
+        if self._grid_data is not None:
+            from playerprefs import BINARY, text_to_playerprefs
+            return text_to_playerprefs(self._grid_data) if encoding == BINARY else self._grid_data.encode("utf-8")
+        return self.converter.serialize_indices(self.indices, encoding)
+
+    def write(self, sink, encoding="text"):
+        data = self.grid_bytes(encoding)
+        sink.write(memoryview(data))
+        return len(data)
+
+    @property
+    def preview(self):
+        if self._preview is None:
+            self._preview = self.converter.palette_preview(self.indices)
+        return self._preview
+
+    def save(self, output_path="pixel_grid_data.txt", encoding="text"):
+        with open(output_path, 'wb') as f:
+            self.write(f, encoding)
+
+    def save_preview(self, output_path="resized_image.png"):
+        self.preview.save(output_path)
 
 class PixelGridConverter:
-    def __init__(self, grid_width=100, grid_height=66, company_name="jrsjams", product_name="MageArena"):
+    def __init__(self, grid_width=100, grid_height=66, company_name="jrsjams", product_name="MageArena", verbose=True,
+                 color_mode="rgb", lut_bits=5, cache=None,
+                 max_source_pixels=MAX_SOURCE_PIXELS, working_pixels=WORKING_PIXELS,
+                 dither="none", dither_space="linear", clusters=CLUSTERS, resample="nearest",
+                 palette=DEFAULT_PALETTE):
+        self.check_options(color_mode, dither, dither_space, clusters, resample, lut_bits)
+
         self.grid_width = grid_width
         self.grid_height = grid_height
         self.company_name = company_name
         self.product_name = product_name
+        # Default only, saves take the path and value name per call
         self.unity_registry_path = rf"SOFTWARE\{company_name}\{product_name}"
-        self.registry_key_name = ""
+        self.verbose = verbose
+        self.color_mode = color_mode
+        self.lut_bits = lut_bits
+        self._color_lut = None
+        self._grid_decoder = None
+        self.cache = cache
+        self.max_source_pixels = max_source_pixels
+        self.working_pixels = working_pixels
+        self.dither = dither
+        self.dither_space = dither_space
+        self.clusters = clusters
+        self.resample = resample
+        self.use_palette(load_palette(palette))
+
+    def use_palette(self, palette):
+        # Compiled once per process by palette.load_palette, converters only keep references
+        self.palette = palette
+        self.pil_palette = palette.pil_palette
+        self.palette_image = palette.image
+        # Palette index -> UV string, so a whole grid can be looked up with one take
+        self.uv_table = palette.uv_table
+        self.palette_rgb = palette.rgb
+        self.palette_lookup = palette.rgb_index
+        self._color_lut = None
+        self._grid_decoder = None
 
-        self.pil_palette = []
-        for color in pixel_color_map:
-            rgb = get_rgb(color)
-            self.pil_palette.append(rgb[0])
-            self.pil_palette.append(rgb[1])
-            self.pil_palette.append(rgb[2])
+    @staticmethod
+    def check_options(color_mode, dither, dither_space, clusters=CLUSTERS, resample="nearest", lut_bits=5):
+        if resample != "nearest":
+            from resampling import check_method
+            check_method(resample)
+        if not 1 <= clusters <= 256:
+            raise ValueError(f"Cluster count must be between 1 and 256, got {clusters}")
+        if not 1 <= lut_bits <= 8:
+            raise ValueError(f"LUT bits must be between 1 and 8, got {lut_bits}")
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f"Unknown color mode '{color_mode}', expected one of {', '.join(COLOR_MODES)}")
+        if dither != "none":
+            from dithering import DITHER_METHODS, DITHER_SPACES
+            if dither not in DITHER_METHODS:
+                raise ValueError(f"Unknown dither method '{dither}', expected one of {', '.join(DITHER_METHODS)}")
+            if dither_space not in DITHER_SPACES:
+                raise ValueError(f"Unknown dither space '{dither_space}', expected one of {', '.join(DITHER_SPACES)}")
+
+    def configure(self, color_mode=None, lut_bits=None, dither=None, dither_space=None, clusters=None, resample=None,
+                  palette=None):
+        color_mode = self.color_mode if color_mode is None else color_mode
+        lut_bits = self.lut_bits if lut_bits is None else lut_bits
+        dither = self.dither if dither is None else dither
+        dither_space = self.dither_space if dither_space is None else dither_space
+        clusters = self.clusters if clusters is None else clusters
+        resample = self.resample if resample is None else resample
+        self.check_options(color_mode, dither, dither_space, clusters, resample, lut_bits)
+        if palette is not None and load_palette(palette) is not self.palette:
+            self.use_palette(load_palette(palette))
+
+        if (color_mode, lut_bits) != (self.color_mode, self.lut_bits):
+            self._color_lut = None
+        self.color_mode = color_mode
+        self.lut_bits = lut_bits
+        self.dither = dither
+        self.dither_space = dither_space
+        self.clusters = clusters
+        self.resample = resample
+
+    def settings_key(self, preserve_colors=True):
+        # Everything besides the source bytes that changes the output grid
+        return (self.grid_width, self.grid_height, self.palette.digest,
+                self.color_mode, self.lut_bits, self.dither, self.dither_space, preserve_colors,
+                None if preserve_colors else self.clusters, self.resample)
 
     def load_png_image(self, png_path):
-        if not os.path.exists(png_path):
+        # Accepts a path or an already opened binary file object
+        if isinstance(png_path, (str, os.PathLike)) and not os.path.exists(png_path):
             raise FileNotFoundError(f"PNG file not found: {png_path}")
         
         try:
             image = Image.open(png_path)
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
+            width, height = image.size
+            if self.max_source_pixels and width * height > self.max_source_pixels:
+                raise ValueError(f"image is {width}x{height}, over the {self.max_source_pixels} pixel limit")
+
+            if self.working_pixels and width * height > self.working_pixels:
+                scale = math.sqrt(width * height / self.working_pixels)
+                image.draft(None, (max(1, int(width / scale)), max(1, int(height / scale))))
+
+            # Stays in the source mode, resize_image_to_grid converts once the image is grid sized
+            image.load()
             return image
         except Exception as e:
             raise ValueError(f"Failed to load PNG image: {e}")
     
     def resize_image_to_grid(self, image):
-        return image.resize((self.grid_width, self.grid_height), Image.NEAREST)
+        if self.resample != "nearest":
+            # Filtered in linear light with cached per-size weights, see resampling.py
+            from resampling import resample
+            return resample(image, (self.grid_width, self.grid_height), self.resample)
+        resized = image.resize((self.grid_width, self.grid_height), Image.NEAREST)
+        if resized.mode != 'RGBA':
+            resized = resized.convert('RGBA')
+        return resized
+
+    def color_lut(self):
+        if self._color_lut is None:
+            from color_lut import get_lut
+            self._color_lut = get_lut(self.palette_rgb, self.color_mode, self.lut_bits, palette_name=self.palette.name)
+        return self._color_lut
+
+    def quantize_space(self):
+        # The color space quantize_to_indices works in, pixels converted to it can be reused
+        return self.dither_space if self.dither != "none" else "rgb"
+
+    def to_quantize_space(self, image):
+        rgb = np.asarray(image.convert("RGB"))
+        if self.dither == "none":
+            return rgb
+        from dithering import to_dither_space
+        return to_dither_space(rgb, self.dither_space)
+
+    def quantize_to_indices(self, image, pixels=None):
+        # Dithering matches colors in its own space, so it takes over from color_mode
+        if self.dither != "none":
+            from dithering import dither_converted
+            if pixels is None:
+                pixels = self.to_quantize_space(image)
+            return dither_converted(pixels, self.palette_rgb, self.dither, self.dither_space)
+
+        if self.color_mode != "rgb":
+            return self.color_lut().lookup(pixels if pixels is not None else np.asarray(image.convert("RGB")))
+
+        quantized = image.convert("RGB").quantize(palette=self.palette_image, dither=0)
+        indices = np.asarray(quantized)
+
+        # Older Pillow versions pad the palette out to 256 entries, remap anything past ours
+        if indices.size and indices.max() >= len(self.uv_table):
+            palette = quantized.getpalette()
+            remap = np.zeros(256, dtype=np.uint8)
+            for i in range(len(palette) // 3):
+                rgb = tuple(palette[i * 3:i * 3 + 3])
+                if rgb not in self.palette_lookup:
+                    continue
+                remap[i] = self.palette_lookup[rgb]
+            indices = remap[indices]
+
+        return indices
+
+    def cluster_to_indices(self, image, resized, pixels=None):
+        # --use-clustering: reduce the source to its most representative colors first, so the
+        # grid uses at most self.clusters game colors
+        from clustering import cluster_table, minibatch_kmeans, sample_pixels
+        from dithering import nearest_indices
+        centers = minibatch_kmeans(sample_pixels(image), self.clusters)
+        table = cluster_table(centers, self.palette_rgb, self.color_lut().lookup if self.color_mode != "rgb" else None)
+
+        if self.dither != "none":
+            from dithering import dither_converted
+            subset = np.unique(table)
+            if pixels is None:
+                pixels = self.to_quantize_space(resized)
+            return subset[dither_converted(pixels, self.palette_rgb[subset], self.dither, self.dither_space)]
+
+        rgb = np.asarray(resized.convert("RGB"), dtype=np.float32)
+        labels = nearest_indices(rgb.reshape(-1, 3), centers.astype(np.float32))
+        return table[labels].reshape(rgb.shape[:2])
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def grid_order(self, indices):
+        # The game reads the grid column by column, starting from the bottom row
+        return indices[::-1].T.ravel()
+
+    def indices_to_uv(self, indices):
+        return self.uv_table.take(self.grid_order(indices)).tolist()
 
     def convert_to_uv_coordinates(self, image, preserve_colors):
-        img_array = np.array(image)
-        uv_grid = []
-        
-        palettized = Image.new('P', (16, 16))
-        palettized.putpalette(self.pil_palette)
-        image = image.convert("RGB").quantize(palette=palettized, dither=0) 
-        px = image.convert("RGB").load()
-        
-        for x in range(0, image.width):
-            for y in range(image.height -1, -1, -1):
-                r, g, b = px[x, y]
-                hex_code = f'{r:02x}{g:02x}{b:02x}'.upper()
-                uv = pixel_color_map.get(hex_code)
-                if uv == None:
-                    raise ValueError(f"Faield to find UV for '{hex_code}'") # should never happen as its been palettized
-                
-                uv_grid.append(uv)
+        if preserve_colors:
+            return self.indices_to_uv(self.quantize_to_indices(image))
+        return self.indices_to_uv(self.cluster_to_indices(image, image))
+
+    def decode_grid_data(self, grid_data):
+        if self._grid_decoder is None:
+            from grid_decoder import GridDecoder
+            self._grid_decoder = GridDecoder(self.palette.uv, self.grid_width, self.grid_height)
+        indices = self._grid_decoder.decode(grid_data)
+        return ConversionResult(self, indices, grid_data if isinstance(grid_data, str) else None)
 
-        return uv_grid
+    def palette_preview(self, indices):
+        preview = Image.fromarray(np.ascontiguousarray(indices, dtype=np.uint8), 'P')
+        preview.putpalette(self.pil_palette)
+        return preview
     
     def serialize_grid_data(self, uv_grid):
         return ",".join(uv_grid)
+
+    def serialize_indices(self, indices, encoding="text"):
+        # Writes the grid straight into one bytes buffer, no per-cell strings
+        return self.palette.serializer().to_buffer(self.grid_order(indices), encoding)
     
-    def find_unity_registry_keys(self):
-        import winreg
+    def registry(self):
+        from registry_backend import default_index
+        index = default_index()
+        if index is None:
+            raise OSError("No registry available (not on Windows and FLAG_REGISTRY_FILE is not set)")
+        return index
 
+    def find_unity_registry_keys(self):
         try:
-            base_key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"SOFTWARE\Unity\UnityEditor")
-            companies = []
-            
-            i = 0
-            while True:
-                try:
-                    company = winreg.EnumKey(base_key, i)
-                    companies.append(company)
-                    i += 1
-                except WindowsError:
-                    break
-            
-            winreg.CloseKey(base_key)
-            
-            print("Found Unity companies:")
-            for company in companies:
-                print(f"  - {company}")
-                try:
-                    company_key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, rf"SOFTWARE\Unity\UnityEditor\{company}")
-                    j = 0
-                    while True:
-                        try:
-                            product = winreg.EnumKey(company_key, j)
-                            print(f"    - {product}")
-                            j += 1
-                        except WindowsError:
-                            break
-                    winreg.CloseKey(company_key)
-                except WindowsError:
-                    pass
-            
-            return companies
-        except WindowsError:
+            products = self.registry().unity_products()
+        except OSError:
             print("No Unity registry keys found")
             return []
+
+        print("Found Unity companies:")
+        for company, names in products.items():
+            print(f"  - {company}")
+            for product in names:
+                print(f"    - {product}")
+        return list(products)
     
-    def save_to_unity_registry(self, grid_data):
-        import winreg
+    def save_to_unity_registry(self, grid_data, binary=False, registry_path=None, key_name=""):
+        # Raises OSError on failure, the caller decides how to report it.
+        # Returns False when the registry already held exactly this value and nothing was written
+        from registry_backend import REG_BINARY, REG_SZ
+        registry_path = registry_path or self.unity_registry_path
+        if binary:
+            # Same form the game writes itself, so saving in-game keeps it intact
+            from playerprefs import text_to_playerprefs
+            value = text_to_playerprefs(grid_data) if isinstance(grid_data, str) else bytes(grid_data)
+            value_type = REG_BINARY
+        else:
+            value, value_type = grid_data, REG_SZ
+
         try:
-            # Try to create or open the registry key
-            try:
-                key = winreg.CreateKeyEx(winreg.HKEY_CURRENT_USER, self.unity_registry_path, 0, winreg.KEY_WRITE)
-            except WindowsError as e:
-                print(f"Failed to create/open registry key: {e}")
-                return False
-            
-            try:
-                # Save as string value instead of binary
-                winreg.SetValueEx(key, self.registry_key_name, 0, winreg.REG_SZ, grid_data)
-                winreg.CloseKey(key)
-                print("Successfully saved to Unity registry!")
-                return True
-            except WindowsError as e:
-                print(f"Failed to set registry value: {e}")
-                winreg.CloseKey(key)
-                return False
-                
-        except Exception as e:
-            print(f"Unexpected error saving to Unity registry: {e}")
-            return False
+            return self.registry().write_value(registry_path, key_name, value, value_type)
+        except OSError as e:
+            raise OSError(f"Failed to save registry value {registry_path}\\{key_name}: {e}")
     
     def save_to_file(self, grid_data, output_path="pixel_grid_data.txt"):
         try:
-            with open(output_path, 'w') as f:
+            mode = 'w' if isinstance(grid_data, str) else 'wb'
+            with open(output_path, mode) as f:
                 f.write(grid_data)
-            print(f"Grid data saved to file: {output_path}")
+            self.log(f"Grid data saved to file: {output_path}")
             return True
         except Exception as e:
             print(f"Failed to save to file: {e}")
             return False
     
+    def convert(self, png_path, preserve_colors=True, instrumentation=None):
+        if instrumentation is None:
+            instrumentation = Instrumentation(hooks=[print_hook] if self.verbose else None)
+
+        # Also takes the encoded image itself, for callers that never had a file
+        source = png_path
+        source_bytes = None
+        if isinstance(png_path, (bytes, bytearray, memoryview)):
+            source_bytes = bytes(png_path)
+            source = io.BytesIO(source_bytes)
+            png_path = "<memory>"
+
+        cache_key = None
+        if self.cache is not None:
+            is_path = isinstance(png_path, (str, os.PathLike))
+            if source_bytes is None and is_path and not os.path.exists(png_path):
+                raise FileNotFoundError(f"PNG file not found: {png_path}")
+            with instrumentation.stage("cache_lookup"):
+                if source_bytes is None:
+                    # An open file is read once, the key and the decoder then use the same bytes
+                    if is_path:
+                        with open(png_path, 'rb') as f:
+                            source_bytes = f.read()
+                    else:
+                        source_bytes = png_path.read()
+                    source = io.BytesIO(source_bytes)
+                cache_key = self.cache.make_key(source_bytes, self.settings_key(preserve_colors))
+                cached = self.cache.get(cache_key)
+
+            if cached is not None:
+                grid_data, indices = cached
+                instrumentation.message(f"Loaded cached conversion for: {png_path}")
+                return ConversionResult(self, indices, grid_data, png_path, instrumentation, cached=True)
+
+        with instrumentation.stage("load", f"Loading PNG image: {png_path}"):
+            image = self.load_png_image(source)
+        
+        with instrumentation.stage("resize", f"Resizing image to {self.grid_width}x{self.grid_height}"):
+            resized_image = self.resize_image_to_grid(image)
+                                
+        with instrumentation.stage("quantize", "Converting to UV coordinates"):
+            if preserve_colors:
+                indices = self.quantize_to_indices(resized_image)
+            else:
+                indices = self.cluster_to_indices(image, resized_image)
+
+        result = ConversionResult(self, indices, source=png_path, metrics=instrumentation)
+        if cache_key is not None:
+            self.cache.put(cache_key, result.grid_data, indices)
+
+        return result
+
     def convert_png_to_pixel_grid(self, png_path, save_to_registry=True, save_to_file=True, 
-                                 output_file="pixel_grid_data.txt", preserve_colors=True):
+                                 output_file="pixel_grid_data.txt", preserve_colors=True,
+                                 preview_file=None, instrumentation=None, binary=False):
         try:
-            print(f"Loading PNG image: {png_path}")
-            image = self.load_png_image(png_path)
-            
-            print(f"Resizing image to {self.grid_width}x{self.grid_height}")
-            resized_image = self.resize_image_to_grid(image)
-                                    
-            print("Converting to UV coordinates")
-            uv_grid = self.convert_to_uv_coordinates(resized_image, preserve_colors)
-            
-            print("Serializing grid data")
-            grid_data = self.serialize_grid_data(uv_grid)
-            
-            resized_image.save("resized_image.png")
-            print("Resized image saved as 'resized_image.png'")
+            result = self.convert(png_path, preserve_colors, instrumentation)
+            grid_data = result.grid_data
+
+            if preview_file:
+                result.save_preview(preview_file)
+                self.log(f"Quantized preview saved as '{preview_file}'")
             
             success = False
             
-            if save_to_registry and os.name == 'nt':
-                success = self.save_to_unity_registry(grid_data)
+            if save_to_registry and registry_available():
+                try:
+                    if self.save_to_unity_registry(grid_data, binary):
+                        print("Successfully saved to Unity registry!")
+                    else:
+                        print("Unity registry already holds this flag, nothing written")
+                    success = True
+                except OSError as e:
+                    print(e)
             
             if save_to_file:
-                file_success = self.save_to_file(grid_data, output_file)
+                file_success = self.save_to_file(result.grid_bytes("binary") if binary else grid_data, output_file)
                 success = success or file_success
             
             if success:
-                print("Conversion completed successfully!")
-                print(f"Image will appear as a {self.grid_width}x{self.grid_height} pixel version of your original")
+                self.log("Conversion completed successfully!")
+                self.log(f"Image will appear as a {self.grid_width}x{self.grid_height} pixel version of your original")
                 
             return grid_data
             
@@ -232,25 +438,171 @@ class PixelGridConverter:
             print(f"Conversion failed: {e}")
             return None
 
+def create_converter(cache_options=None, **options):
+    if cache_options is not None:
+        from conversion_cache import ConversionCache
+        options["cache"] = ConversionCache(**cache_options)
+    return PixelGridConverter(**options)
+
+def registry_available():
+    from registry_backend import default_index
+    return default_index() is not None
+
+_shared_converters = {}
+_shared_converters_lock = threading.Lock()
+
+def shared_converter(**options):
+    # Converters keep no per-job state, so one per distinct settings can serve every thread
+    key = tuple(sorted(options.items()))
+    with _shared_converters_lock:
+        converter = _shared_converters.get(key)
+        if converter is None:
+            converter = PixelGridConverter(verbose=False, **options)
+            _shared_converters[key] = converter
+        return converter
+
+def convert_source(source, preserve_colors=True, instrumentation=None, **options):
+    # Path, file object or encoded image bytes in, ConversionResult out; nothing printed or written
+    return shared_converter(**options).convert(source, preserve_colors, instrumentation or Instrumentation())
+
+def decode_main(args):
+    from grid_decoder import GridDecodeError, read_grid_sources
+
+    if not args:
+        print_usage()
+        return 1
+
+    source = args[0]
+    output = args[1] if len(args) > 1 else None
+    converter = PixelGridConverter(verbose=False)
+    try:
+        grids = read_grid_sources(source)
+    except (OSError, GridDecodeError) as e:
+        print(f"Failed to read {source}: {e}")
+        return 1
+
+    failed = 0
+    stem = os.path.splitext(source)[0]
+    # A .png output is a file, anything else a folder that every grid is written into
+    output_file = output and output.lower().endswith(".png") and not os.path.isdir(output)
+    for name, grid_data in grids:
+        label = name or source
+        try:
+            result = converter.decode_grid_data(grid_data)
+        except GridDecodeError as e:
+            print(f"INVALID {label}: {e}")
+            failed += 1
+            continue
+
+        if output_file:
+            output_path = output if len(grids) == 1 else f"{os.path.splitext(output)[0]}_{name}.png"
+        elif output:
+            output_path = os.path.join(output, f"{name or os.path.basename(stem)}.png")
+        elif name:
+            output_path = os.path.join(os.path.dirname(source), f"{name}.png")
+        else:
+            output_path = f"{stem}.png"
+        try:
+            if os.path.dirname(output_path):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            result.save_preview(output_path)
+        except (OSError, ValueError) as e:
+            print(f"FAILED {label} -> {output_path}: {e}")
+            failed += 1
+            continue
+        print(f"OK {label} -> {output_path}")
+
+    return 1 if failed else 0
+
+def print_profile(profiler, output=None):
+    import pstats
+    if output:
+        profiler.dump_stats(output)
+        print(f"Profile written to {output}")
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+def write_metrics(output, text, stream=None):
+    if output == "-":
+        stream = stream or sys.stdout
+        stream.write(text + "\n")
+        stream.flush()
+        return
+    with open(output, 'w') as f:
+        f.write(text)
+    print(f"Metrics written to {output}")
+
+def print_usage():
+    print("Usage: python png_converter.py <png_file_path> [--no-registry] [--no-file] [--find-registry] [--use-clustering]")
+    print("       python png_converter.py ... [--clusters N]  (colors --use-clustering reduces to, default 16)")
+    print("       python png_converter.py <dir|glob|@manifest> ... [--output-dir DIR] [--workers N]  (batch mode)")
+    print("       python png_converter.py <animation|dir|glob> --frames [--output-dir DIR] [--workers N]  (one grid per frame)")
+    print("       python png_converter.py <dir> ... --watch [--output-dir DIR] [--poll SECONDS] [--once] [--index FILE]")
+    print("         (convert new and changed images as they arrive, unchanged ones are skipped across restarts)")
+    print("       python png_converter.py ... [--color-mode rgb|lab|ciede2000] [--lut-bits N]")
+    print("       python png_converter.py ... [--cache-dir DIR] [--cache-size MB] [--preview-file PATH]")
+    print("       python png_converter.py ... [--max-pixels N]  (reject larger sources, 0 for no limit)")
+    print("       python png_converter.py ... [--dither none|floyd-steinberg|sierra|bayer] [--dither-space linear|lab]")
+    print("       python png_converter.py ... [--resample nearest|box|area|lanczos]  (how the source is shrunk to the grid)")
+    print("       python png_converter.py ... [--palette NAME|FILE]  (a palette from palettes/ or a palette file)")
+    print("       python png_converter.py <png_file_path> --binary  (Unity's REG_BINARY form for registry and file)")
+    print("       python png_converter.py ... [--metrics FILE|-] [--trace-memory] [--profile] [--profile-output FILE]")
+    print("       python png_converter.py --decode <grid.txt|backup.reg> [output.png]  (render stored grid data)")
+    print("       python png_converter.py --serve [--port N] [--socket PATH] [--max-concurrent N]  (conversion server)")
+    print("       python png_converter.py --find-registry  (to find Unity registry paths)")
+    print("Example: python png_converter.py my_image.png")
+    print("         python png_converter.py my_image.png --use-clustering  (for too many colors)")
+    print("         python png_converter.py flags/ more_flags/*.png --output-dir grids")
+
+def option_value(args, i):
+    if i + 1 >= len(args):
+        print(f"Missing value for {args[i]}")
+        print_usage()
+        sys.exit(1)
+    return args[i + 1]
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python png_converter.py <png_file_path> [--no-registry] [--no-file] [--find-registry] [--use-clustering]")
-        print("       python png_converter.py --find-registry  (to find Unity registry paths)")
-        print("Example: python png_converter.py my_image.png")
-        print("         python png_converter.py my_image.png --use-clustering  (for too many colors)")
+    args = sys.argv[1:]
+    if not args:
+        print_usage()
         sys.exit(1)
     
-    if sys.argv[1] == "--find-registry":
+    if args[0] == "--find-registry":
         converter = PixelGridConverter()
         converter.find_unity_registry_keys()
         sys.exit(0)
     
-    png_path = sys.argv[1]
+    if args[0] == "--decode":
+        sys.exit(decode_main(args[1:]))
+    
+    if args[0] == "--serve":
+        from conversion_server import serve_main
+        sys.exit(serve_main(args[1:]))
+    
+    inputs = []
     save_to_registry = True
     save_to_file = True
     preserve_colors = True
+    batch = False
+    output_dir = None
+    workers = None
+    converter_options = {}
+    cache_dir = None
+    cache_size = 64
+    preview_file = None
+    metrics_file = None
+    trace_memory = False
+    profile = False
+    profile_output = None
+    binary = False
+    frames = False
+    watch = False
+    poll_interval = None
+    once = False
+    index_file = None
     
-    for i, arg in enumerate(sys.argv[2:], 2):
+    i = 0
+    while i < len(args):
+        arg = args[i]
         if arg == "--no-registry":
             save_to_registry = False
         elif arg == "--no-file":
@@ -258,21 +610,171 @@ def main():
         elif arg == "--find-registry":
             converter = PixelGridConverter()
             converter.find_unity_registry_keys()
-            continue
         elif arg == "--use-clustering":
             preserve_colors = False
+        elif arg == "--batch":
+            batch = True
+        elif arg == "--frames":
+            frames = True
+        elif arg == "--watch":
+            watch = True
+        elif arg == "--poll":
+            poll_interval = float(option_value(args, i))
+            i += 1
+        elif arg == "--once":
+            once = True
+        elif arg == "--index":
+            index_file = option_value(args, i)
+            i += 1
+        elif arg == "--output-dir":
+            output_dir = option_value(args, i)
+            batch = True
+            i += 1
+        elif arg == "--workers":
+            workers = int(option_value(args, i))
+            batch = True
+            i += 1
+        elif arg == "--color-mode":
+            converter_options["color_mode"] = option_value(args, i)
+            i += 1
+        elif arg == "--lut-bits":
+            converter_options["lut_bits"] = int(option_value(args, i))
+            i += 1
+        elif arg == "--cache-dir":
+            cache_dir = option_value(args, i)
+            i += 1
+        elif arg == "--clusters":
+            converter_options["clusters"] = int(option_value(args, i))
+            preserve_colors = False
+            i += 1
+        elif arg == "--dither":
+            converter_options["dither"] = option_value(args, i)
+            i += 1
+        elif arg == "--dither-space":
+            converter_options["dither_space"] = option_value(args, i)
+            i += 1
+        elif arg == "--palette":
+            converter_options["palette"] = option_value(args, i)
+            i += 1
+        elif arg == "--resample":
+            converter_options["resample"] = option_value(args, i)
+            i += 1
+        elif arg == "--max-pixels":
+            converter_options["max_source_pixels"] = int(option_value(args, i))
+            i += 1
+        elif arg == "--metrics":
+            metrics_file = option_value(args, i)
+            i += 1
+        elif arg == "--binary":
+            binary = True
+        elif arg == "--trace-memory":
+            trace_memory = True
+        elif arg == "--profile":
+            profile = True
+        elif arg == "--profile-output":
+            profile = True
+            profile_output = option_value(args, i)
+            i += 1
+        elif arg == "--preview-file":
+            preview_file = option_value(args, i)
+            i += 1
+        elif arg == "--cache-size":
+            cache_size = float(option_value(args, i))
+            i += 1
+        elif arg.startswith("--"):
+            print(f"Unknown option: {arg}")
+            print_usage()
+            sys.exit(1)
+        else:
+            inputs.append(arg)
+        i += 1
     
-    converter = PixelGridConverter()
+    if not inputs:
+        print_usage()
+        sys.exit(1)
+    
+    # With --metrics - stdout carries only the JSON, progress and everything else printed goes to stderr
+    metrics_stream = None
+    if metrics_file == "-":
+        metrics_stream = sys.stdout
+        sys.stdout = sys.stderr
+    
+    if cache_dir:
+        converter_options["cache_options"] = {"disk_dir": cache_dir, "disk_max_bytes": int(cache_size * 1024 * 1024)}
+    
+    try:
+        converter = create_converter(**converter_options)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    
+    if watch:
+        from watch_folder import run_watch
+        summary = run_watch(inputs, converter.settings_key(preserve_colors), output_dir=output_dir,
+                            index_path=index_file, workers=workers, preserve_colors=preserve_colors,
+                            converter_options=converter_options, poll_interval=poll_interval, once=once,
+                            encoding="binary" if binary else "text")
+        sys.exit(0 if summary is not None and summary["failed"] == 0 else 1)
+    
+    if frames:
+        from animation import run_animation
+        try:
+            summary = run_animation(inputs, output_dir=output_dir, workers=workers, preserve_colors=preserve_colors,
+                                    converter_options=converter_options, encoding="binary" if binary else "text")
+        except Exception as e:
+            print(f"Frame conversion failed: {e}")
+            sys.exit(1)
+        sys.exit(0 if summary["frames"] > 0 else 1)
+    
+    if batch or len(inputs) > 1 or not os.path.isfile(inputs[0]):
+        from batch_convert import run_batch
+        if profiler:
+            # Worker processes would not show up in the profile
+            workers = 1
+            profiler.enable()
+        summary = run_batch(inputs, output_dir=output_dir, workers=workers, preserve_colors=preserve_colors,
+                            converter_options=converter_options, collect_metrics=bool(metrics_file),
+                            trace_memory=trace_memory, encoding="binary" if binary else "text")
+        if profiler:
+            profiler.disable()
+            print_profile(profiler, profile_output)
+        if metrics_file:
+            write_metrics(metrics_file, json.dumps(summary["metrics"], indent=2), metrics_stream)
+        sys.exit(0 if summary["failed"] == 0 and summary["total"] > 0 else 1)
+    
+    instrumentation = None
+    if metrics_file or trace_memory:
+        instrumentation = Instrumentation(hooks=[print_hook], trace_memory=trace_memory)
+    
+    if profiler:
+        profiler.enable()
     result = converter.convert_png_to_pixel_grid(
-        png_path, 
+        inputs[0], 
         save_to_registry=save_to_registry,
         save_to_file=save_to_file,
-        preserve_colors=preserve_colors
+        preserve_colors=preserve_colors,
+        preview_file=preview_file,
+        instrumentation=instrumentation,
+        output_file="pixel_grid_data.bin" if binary else "pixel_grid_data.txt",
+        binary=binary
     )
+    if profiler:
+        profiler.disable()
+        print_profile(profiler, profile_output)
+    
+    if instrumentation and metrics_file:
+        write_metrics(metrics_file, instrumentation.to_json(source=inputs[0]), metrics_stream)
     
     if result:
         print("\nGrid data preview (first 200 characters):")
         print(result[:200] + "..." if len(result) > 200 else result)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+import time
+
+# Same numbers as winreg, so values move between backends unchanged
+REG_SZ = 1
+REG_BINARY = 3
+REG_DWORD = 4
+TYPE_NAMES = {REG_SZ: "STRING", REG_BINARY: "BINARY", REG_DWORD: "DWORD"}
+
+FLAG_PREFIX = "flagGrid_"
+UNITY_EDITOR_PATH = r"SOFTWARE\Unity\UnityEditor"
+SCAN_BASE_PATHS = (UNITY_EDITOR_PATH, "SOFTWARE")
+SCAN_KEYWORDS = ("flag", "grid", "game", "unity")
+SCAN_COMPANIES = ("jrsjams", "unity")
+# Set to a JSON file to use FileBackend instead of the real registry (tests, benchmarks, Linux)
+REGISTRY_FILE_ENV = "FLAG_REGISTRY_FILE"
+
+
+def type_name(value_type):
+    return TYPE_NAMES.get(value_type, f"TYPE_{value_type}")
+
+
+class WinregBackend:
+    # Paths are relative to HKEY_CURRENT_USER, every method raises OSError like winreg does
+    def __init__(self):
+        import winreg
+        self.winreg = winreg
+
+    def _open(self, path, access=None):
+        winreg = self.winreg
+        return winreg.OpenKey(winreg.HKEY_CURRENT_USER, path, 0, access or winreg.KEY_READ)
+
+    def modified(self, path):
+        with self._open(path) as key:
+            return self.winreg.QueryInfoKey(key)[2]
+
+    def subkeys(self, path):
+        with self._open(path) as key:
+            return [self.winreg.EnumKey(key, i) for i in range(self.winreg.QueryInfoKey(key)[0])]
+
+    def values(self, path, limit=None):
+        with self._open(path) as key:
+            count = self.winreg.QueryInfoKey(key)[1]
+            if limit is not None:
+                count = min(count, limit)
+            return [self.winreg.EnumValue(key, i) for i in range(count)]
+
+    def set_value(self, path, name, data, value_type):
+        winreg = self.winreg
+        with winreg.CreateKeyEx(winreg.HKEY_CURRENT_USER, path, 0, winreg.KEY_WRITE) as key:
+            winreg.SetValueEx(key, name, 0, value_type, data)
+
+
+class FileBackend:
+    # A JSON file standing in for HKEY_CURRENT_USER. Reloaded whenever another process changes it
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.stamp = None
+
+    def _reload(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.keys, self.stamp = {}, None
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        self.keys = {}
+        for path, entry in raw.get("keys", {}).items():
+            values = {name: (value["type"], bytes.fromhex(value["data"]) if value["type"] == REG_BINARY
+                             else value["data"]) for name, value in entry.get("values", {}).items()}
+            self.keys[path.lower()] = {"name": path, "modified": entry.get("modified", 0), "values": values}
+        self.stamp = stamp
+
+    def _save(self):
+        raw = {"keys": {}}
+        for entry in self.keys.values():
+            raw["keys"][entry["name"]] = {
+                "modified": entry["modified"],
+                "values": {name: {"type": value_type, "data": data.hex() if value_type == REG_BINARY else data}
+                           for name, (value_type, data) in entry["values"].items()},
+            }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(raw, f)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def _key(self, path):
+        self._reload()
+        entry = self.keys.get(path.lower())
+        if entry is None:
+            raise FileNotFoundError(f"Registry key not found: {path}")
+        return entry
+
+    def _create(self, path):
+        # Like the registry, creating a key also creates its parents and touches the parent it was added to
+        parts = path.split("\\")
+        for depth in range(1, len(parts) + 1):
+            current = "\\".join(parts[:depth])
+            if current.lower() not in self.keys:
+                self.keys[current.lower()] = {"name": current, "modified": time.time_ns(), "values": {}}
+                if depth > 1:
+                    self.keys["\\".join(parts[:depth - 1]).lower()]["modified"] = time.time_ns()
+        return self.keys[path.lower()]
+
+    def modified(self, path):
+        with self.lock:
+            return self._key(path)["modified"]
+
+    def subkeys(self, path):
+        with self.lock:
+            prefix = self._key(path)["name"].lower() + "\\"
+            return [entry["name"][len(prefix):] for lower, entry in self.keys.items()
+                    if lower.startswith(prefix) and "\\" not in lower[len(prefix):]]
+
+    def values(self, path, limit=None):
+        with self.lock:
+            values = [(name, data, value_type) for name, (value_type, data) in self._key(path)["values"].items()]
+        return values if limit is None else values[:limit]
+
+    def set_value(self, path, name, data, value_type):
+        with self.lock:
+            self._reload()
+            entry = self._create(path)
+            entry["values"][name] = (value_type, bytes(data) if value_type == REG_BINARY else data)
+            entry["modified"] = time.time_ns()
+            self._save()
+
+
+class RegistryIndex:
+    # Remembers what was read per key together with the key's last-write time, and only
+    # re-reads keys whose time changed
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.RLock()
+        self._subkeys = {}
+        self._values = {}
+        self._matches = {}
+        self.reads = 0
+
+    def _cached(self, cache, path, read):
+        try:
+            stamp = self.backend.modified(path)
+        except OSError:
+            cache.pop(path.lower(), None)
+            raise
+        with self.lock:
+            entry = cache.get(path.lower())
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        self.reads += 1
+        result = read()
+        with self.lock:
+            cache[path.lower()] = (stamp, result)
+        return result
+
+    def subkeys(self, path):
+        return self._cached(self._subkeys, path, lambda: self.backend.subkeys(path))
+
+    def values(self, path):
+        # name -> (data, type)
+        return self._cached(self._values, path,
+                            lambda: {name: (data, value_type) for name, data, value_type in self.backend.values(path)})
+
+    def flag_values(self, path, prefix=FLAG_PREFIX):
+        return {name: value for name, value in self.values(path).items() if name.startswith(prefix)}
+
+    def _looks_like_game(self, path):
+        # Only the first few value names are checked, as the original scan did
+        values = self.backend.values(path, limit=10)
+        return any(keyword in name.lower() for name, _, _ in values for keyword in SCAN_KEYWORDS)
+
+    def unity_paths(self):
+        paths = []
+        for base_path in SCAN_BASE_PATHS:
+            try:
+                companies = self.subkeys(base_path)
+            except OSError:
+                continue
+            for company in companies:
+                company_path = f"{base_path}\\{company}"
+                try:
+                    products = self.subkeys(company_path)
+                except OSError:
+                    continue
+                for product in products:
+                    full_path = f"{company_path}\\{product}"
+                    try:
+                        matches = self._cached(self._matches, full_path, lambda: self._looks_like_game(full_path))
+                    except OSError:
+                        continue
+                    if matches or company.lower() in SCAN_COMPANIES:
+                        paths.append(full_path)
+        return paths
+
+    def unity_products(self):
+        # company -> products under the Unity editor key
+        products = {}
+        for company in self.subkeys(UNITY_EDITOR_PATH):
+            try:
+                products[company] = self.subkeys(f"{UNITY_EDITOR_PATH}\\{company}")
+            except OSError:
+                products[company] = []
+        return products
+
+    def write_value(self, path, name, data, value_type):
+        # Returns False when the stored value already matches, so nothing is written
+        try:
+            current = self.values(path).get(name)
+        except OSError:
+            current = None
+        if current is not None and current[1] == value_type and current[0] == data:
+            return False
+        self.backend.set_value(path, name, data, value_type)
+        return True
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_backend():
+    path = os.environ.get(REGISTRY_FILE_ENV)
+    if path:
+        return FileBackend(path)
+    # Anywhere winreg imports: Windows, or fake_winreg installed for headless checks
+    try:
+        return WinregBackend()
+    except ImportError:
+        return None
+
+
+def default_index():
+    # None when there is no registry to write to
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            backend = default_backend()
+            if backend is not None:
+                _default_index = RegistryIndex(backend)
+        return _default_index
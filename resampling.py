@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+RESAMPLE_METHODS = ("nearest", "box", "area", "lanczos")
+LANCZOS_LOBES = 3
+# Source rows converted to linear light at once
+CHUNK_ROWS = 64
+
+# uint8 sRGB -> linear light, a table lookup is far cheaper than the power curve per pixel
+_TO_LINEAR = np.array([c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+                       for c in np.arange(256) / 255.0], dtype=np.float32)
+
+
+def check_method(method):
+    if method not in RESAMPLE_METHODS:
+        raise ValueError(f"Unknown resample method '{method}', expected one of {', '.join(RESAMPLE_METHODS)}")
+
+
+def linear_to_srgb8(linear):
+    c = np.clip(linear, 0.0, 1.0)
+    srgb = np.where(c <= 0.0031308, c * 12.92, 1.055 * np.power(c, 1 / 2.4) - 0.055)
+    return np.rint(srgb * 255).astype(np.uint8)
+
+
+def _box_weights(src, dst):
+    # Every source pixel whose center falls inside the output pixel's footprint counts once
+    scale = src / dst
+    centers = np.arange(src) + 0.5
+    owner = np.minimum((centers / scale).astype(np.int64), dst - 1)
+    weights = np.zeros((dst, src), dtype=np.float64)
+    weights[owner, np.arange(src)] = 1.0
+    # Upscaling leaves some outputs without a source center, they take the nearest pixel
+    empty = weights.sum(axis=1) == 0
+    if empty.any():
+        rows = np.nonzero(empty)[0]
+        weights[rows, np.minimum(((rows + 0.5) * scale).astype(np.int64), src - 1)] = 1.0
+    return weights
+
+
+def _area_weights(src, dst):
+    # Exact overlap of each output footprint with each source pixel
+    scale = src / dst
+    starts = np.arange(dst)[:, None] * scale
+    ends = starts + scale
+    edges = np.arange(src)[None, :]
+    return np.clip(np.minimum(ends, edges + 1) - np.maximum(starts, edges), 0.0, None)
+
+
+def _lanczos_weights(src, dst):
+    # Stretched by the scale when shrinking, so the filter also averages away detail the grid can't hold
+    scale = src / dst
+    stretch = max(scale, 1.0)
+    support = LANCZOS_LOBES * stretch
+    centers = (np.arange(dst) + 0.5) * scale - 0.5
+    taps = np.arange(-int(np.ceil(support)), int(np.ceil(support)) + 1)
+    positions = np.floor(centers)[:, None].astype(np.int64) + taps[None, :]
+    x = (positions - centers[:, None]) / stretch
+    kernel = np.sinc(x) * np.sinc(x / LANCZOS_LOBES)
+    kernel[np.abs(x) >= LANCZOS_LOBES] = 0.0
+    # Taps past the edge are folded onto the edge pixel
+    weights = np.zeros((dst, src), dtype=np.float64)
+    rows = np.repeat(np.arange(dst), len(taps))
+    np.add.at(weights, (rows, np.clip(positions, 0, src - 1).ravel()), kernel.ravel())
+    return weights
+
+
+_WEIGHT_BUILDERS = {"box": _box_weights, "area": _area_weights, "lanczos": _lanczos_weights}
+
+
+@lru_cache(maxsize=64)
+def weight_matrix(src, dst, method):
+    # (dst, src) matrix with rows summing to 1. Cached, so every source of the same size
+    # reuses it; read-only because it is shared between threads
+    weights = _WEIGHT_BUILDERS[method](src, dst)
+    weights /= weights.sum(axis=1, keepdims=True)
+    weights = weights.astype(np.float32)
+    weights.flags.writeable = False
+    return weights
+
+
+@lru_cache(maxsize=64)
+def row_blocks(src, dst, method, block=CHUNK_ROWS):
+    # (source rows, output rows) per block of source rows: each block only feeds the few
+    # output rows whose filter reaches it, so the row pass never multiplies by zeros
+    weights = weight_matrix(src, dst, method)
+    blocks = []
+    for start in range(0, src, block):
+        stop = min(start + block, src)
+        rows = np.nonzero(weights[:, start:stop].any(axis=1))[0]
+        blocks.append((start, stop, rows[0], rows[-1] + 1))
+    return blocks
+
+
+def resample_pixels(pixels, size, method):
+    # pixels is (height, width, channels) uint8 sRGB (plus straight alpha as the 4th channel),
+    # size is (width, height) like PIL. Returns linear light float32
+    height, width, channels = pixels.shape
+    rows = weight_matrix(height, size[1], method)
+    columns = weight_matrix(width, size[0], method)
+
+    # Converted to linear a block at a time, so the float copy of the source stays in cache
+    flat = pixels.reshape(height, width * channels)
+    shrunk = np.zeros((size[1], width * channels), dtype=np.float32)
+    for start, stop, first, last in row_blocks(height, size[1], method):
+        linear = np.take(_TO_LINEAR, flat[start:stop])
+        if channels == 4:
+            linear[:, 3::4] = flat[start:stop, 3::4] * np.float32(1 / 255)
+        shrunk[first:last] += rows[first:last, start:stop] @ linear
+
+    shrunk = shrunk.reshape(size[1], width, channels).transpose(1, 0, 2).reshape(width, size[1] * channels)
+    return (columns @ shrunk).reshape(size[0], size[1], channels).transpose(1, 0, 2)
+
+
+def resample(image, size, method="area"):
+    # Returns an RGBA image of the given size, filtered in linear light
+    check_method(method)
+    if method == "nearest":
+        resized = image.resize(size, Image.NEAREST)
+        return resized if resized.mode == "RGBA" else resized.convert("RGBA")
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if has_alpha:
+        image = image if image.mode == "RGBA" else image.convert("RGBA")
+        # Fully opaque images skip the alpha channel, a quarter less to filter
+        has_alpha = image.getchannel("A").getextrema()[0] < 255
+    pixels = np.asarray(image if image.mode == ("RGBA" if has_alpha else "RGB")
+                        else image.convert("RGBA" if has_alpha else "RGB"))
+    # Color is filtered without premultiplying, matching the quantizer, which ignores alpha
+    filtered = resample_pixels(pixels, size, method)
+
+    out = np.empty((size[1], size[0], 4), dtype=np.uint8)
+    out[..., :3] = linear_to_srgb8(filtered[..., :3])
+    out[..., 3] = np.rint(np.clip(filtered[..., 3], 0.0, 1.0) * 255).astype(np.uint8) if has_alpha else 255
+    return Image.fromarray(out, "RGBA")
@@ -0,0 +1,417 @@
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import shutil
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import batch_convert
+from batch_convert import IMAGE_EXTENSIONS, _init_worker, output_extension
+
+INDEX_VERSION = 1
+INDEX_NAME = ".pixel_grid_index.json"
+POLL_INTERVAL = 2.0
+# A polled file written to more recently than this may still be being copied in, it waits for the next scan
+SETTLE_SECONDS = 1.0
+# Copying a folder in fires a burst of events, they are gathered for this long and handled together
+DEBOUNCE_SECONDS = 0.25
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    # One watch per folder, new subfolders are watched as they appear. Files are only reported
+    # once closed after writing or moved in, never half copied
+    def __init__(self, roots):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.folders = {}
+        for root in roots:
+            self.add_tree(root)
+
+    def add_tree(self, root):
+        for folder, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                print(f"Cannot watch {folder}: {os.strerror(ctypes.get_errno())}")
+            else:
+                self.folders[wd] = folder
+
+    def read_events(self, changed):
+        # Returns False when the kernel queue overflowed and events were lost
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return True
+
+        complete = True
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                complete = False
+            elif mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+            elif wd in self.folders and name:
+                path = os.path.join(self.folders[wd], os.fsdecode(name))
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files can land before the watch is added, so the new folder is scanned as well
+                    self.add_tree(path)
+                    changed.add(path)
+                elif mask & (IN_ISDIR | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE):
+                    changed.add(path)
+        return complete
+
+    def wait(self):
+        # The paths that changed, or None when everything has to be rescanned
+        select.select([self.fd], [], [])
+        changed = set()
+        complete = True
+        deadline = time.monotonic() + DEBOUNCE_SECONDS
+        while True:
+            complete = self.read_events(changed) and complete
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.fd], [], [], remaining)[0]:
+                break
+        return changed if complete else None
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # Every wait is a full rescan, which only stats files the index already knows
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+
+    def wait(self):
+        time.sleep(self.interval)
+        return None
+
+    def close(self):
+        pass
+
+
+def make_watcher(roots, poll_interval=None):
+    if poll_interval is None and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available ({e}), polling instead")
+    return PollingWatcher(poll_interval or POLL_INTERVAL)
+
+
+class FolderIndex:
+    # source path -> mtime, size, content hash, settings and output of its last conversion,
+    # saved as JSON so a restart knows what is already done
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("version") == INDEX_VERSION:
+                self.files = raw["files"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"Ignoring unreadable index {path}: {e}")
+
+        self.owners = {entry["output"]: source for source, entry in self.files.items()}
+        self.hashes = {(entry["hash"], entry["settings"]): source for source, entry in self.files.items()
+                       if not entry["error"]}
+
+    def put(self, source, entry):
+        old = self.files.get(source)
+        if old is not None and self.hashes.get((old["hash"], old["settings"])) == source:
+            del self.hashes[(old["hash"], old["settings"])]
+        self.files[source] = entry
+        self.owners[entry["output"]] = source
+        # The first source with these bytes stays the one others are copied from
+        if not entry["error"]:
+            self.hashes.setdefault((entry["hash"], entry["settings"]), source)
+        self.dirty = True
+
+    def remove(self, path):
+        # A file, or a folder and everything that was under it
+        prefix = path.rstrip(os.sep) + os.sep
+        removed = [source for source in self.files if source == path or source.startswith(prefix)]
+        for source in removed:
+            entry = self.files.pop(source)
+            if self.owners.get(entry["output"]) == source:
+                del self.owners[entry["output"]]
+            if self.hashes.get((entry["hash"], entry["settings"])) == source:
+                del self.hashes[(entry["hash"], entry["settings"])]
+        self.dirty = self.dirty or bool(removed)
+        return len(removed)
+
+    def converted(self, content_hash, settings, path=None):
+        # The entry of path itself when only its mtime changed, else another source with the same
+        # bytes and settings, as long as its output still exists
+        for source in (path, self.hashes.get((content_hash, settings))):
+            entry = self.files.get(source)
+            if (entry is not None and entry["hash"] == content_hash and entry["settings"] == settings
+                    and not entry["error"] and os.path.isfile(entry["output"])):
+                return entry
+        return None
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+
+class FolderWatcher:
+    def __init__(self, roots, settings, output_dir=None, index_path=None, workers=None, preserve_colors=True,
+                 converter_options=None, encoding="text"):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        # The encoding changes the output bytes, so it is part of the settings an entry was made with
+        self.settings = repr((settings, encoding))
+        self.encoding = encoding
+        self.extension = output_extension(encoding)
+        self.index = FolderIndex(os.path.abspath(index_path or os.path.join(self.output_dir or self.roots[0],
+                                                                            INDEX_NAME)))
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.preserve_colors = preserve_colors
+        self.converter_options = converter_options or {}
+        self.settle = 0.0
+        self.executor = None
+        self.worker_ready = False
+
+    def root_of(self, path):
+        return max((root for root in self.roots if path == root or path.startswith(root.rstrip(os.sep) + os.sep)),
+                   key=len)
+
+    def output_path(self, path):
+        stem, extension = os.path.splitext(os.path.basename(path))
+        folder = os.path.dirname(path)
+        if self.output_dir:
+            folder = os.path.normpath(os.path.join(self.output_dir, os.path.relpath(folder, self.root_of(path))))
+        output = os.path.join(folder, stem + self.extension)
+        # flag.png and flag.jpg side by side would both write flag.txt, so the second keeps its extension
+        owner = self.index.owners.get(output)
+        if owner is not None and owner != path:
+            output = os.path.join(folder, f"{stem}_{extension.lstrip('.').lower()}{self.extension}")
+        return output
+
+    def images_under(self, folder):
+        for current, subfolders, names in os.walk(folder):
+            subfolders[:] = sorted(name for name in subfolders if os.path.join(current, name) != self.output_dir)
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(current, name)
+
+    def rescan(self):
+        paths = [path for root in self.roots for path in self.images_under(root)]
+        seen = set(paths)
+        removed = 0
+        for source in list(self.index.files):
+            if source not in seen and any(source.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots):
+                removed += self.index.remove(source)
+        summary = self.update(paths)
+        summary["removed"] += removed
+        return summary
+
+    def changed(self, paths):
+        # A new folder is reported along with the files in it, so each image is only kept once
+        images = {}
+        removed = 0
+        for path in sorted(paths):
+            if os.path.isdir(path):
+                images.update(dict.fromkeys(self.images_under(path)))
+            elif path.lower().endswith(IMAGE_EXTENSIONS):
+                images[path] = None
+            elif not os.path.exists(path):
+                # A folder that was deleted or moved away
+                removed += self.index.remove(path)
+        summary = self.update(list(images))
+        summary["removed"] += removed
+        return summary
+
+    def convert_jobs(self, jobs):
+        if self.workers == 1:
+            if not self.worker_ready:
+                _init_worker(self.converter_options)
+                self.worker_ready = True
+            return map(batch_convert._convert_job, jobs)
+        if self.executor is None:
+            # Started on the first change, a restart with nothing to do never pays for it
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.converter_options,))
+        return self.executor.map(batch_convert._convert_job, jobs,
+                                 chunksize=max(1, len(jobs) // (self.workers * 8)))
+
+    def update(self, paths):
+        summary = {"converted": 0, "copied": 0, "unchanged": 0, "failed": 0, "waiting": 0, "removed": 0}
+        entries = {}
+        duplicates = {}
+        jobs = []
+
+        for path in dict.fromkeys(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                summary["removed"] += self.index.remove(path)
+                continue
+
+            # Same size and mtime as last time is trusted without reading the file
+            entry = self.index.files.get(path)
+            if (entry and entry["settings"] == self.settings and entry["mtime_ns"] == stat.st_mtime_ns
+                    and entry["size"] == stat.st_size and (entry["error"] or os.path.isfile(entry["output"]))):
+                summary["unchanged"] += 1
+                continue
+            if self.settle and time.time() - stat.st_mtime < self.settle:
+                summary["waiting"] += 1
+                continue
+
+            try:
+                with open(path, "rb") as f:
+                    content_hash = hashlib.sha256(f.read()).hexdigest()
+            except OSError as e:
+                summary["failed"] += 1
+                print(f"FAILED {path}: {e}")
+                continue
+
+            output = self.output_path(path)
+            self.index.owners[output] = path
+            new_entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": content_hash,
+                         "settings": self.settings, "output": output, "error": None}
+
+            # Touched but not changed, or the same image as one converted before: no conversion needed
+            done = self.index.converted(content_hash, self.settings, path)
+            if done is not None and done["output"] == output:
+                self.index.put(path, new_entry)
+                summary["unchanged"] += 1
+            elif done is not None:
+                self.copy_output(done["output"], path, new_entry, summary)
+            elif content_hash in duplicates:
+                duplicates[content_hash].append((path, new_entry))
+            else:
+                duplicates[content_hash] = []
+                entries[path] = new_entry
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+                jobs.append((path, output, self.preserve_colors, False, self.encoding))
+
+        if jobs:
+            for png_path, output_path, error, elapsed, _ in self.convert_jobs(jobs):
+                entry = entries[png_path]
+                entry["error"] = error
+                self.index.put(png_path, entry)
+                if error:
+                    summary["failed"] += 1
+                    print(f"FAILED {png_path}: {error}")
+                    continue
+                summary["converted"] += 1
+                print(f"{png_path} -> {output_path} ({elapsed * 1000:.1f} ms)")
+                for path, duplicate in duplicates[entry["hash"]]:
+                    self.copy_output(output_path, path, duplicate, summary)
+
+        self.index.save()
+        return summary
+
+    def copy_output(self, source_output, path, entry, summary):
+        try:
+            os.makedirs(os.path.dirname(entry["output"]), exist_ok=True)
+            shutil.copyfile(source_output, entry["output"])
+        except OSError as e:
+            summary["failed"] += 1
+            print(f"FAILED {path}: {e}")
+            return
+        self.index.put(path, entry)
+        summary["copied"] += 1
+        print(f"{path} -> {entry['output']} (same image as {source_output})")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.index.save()
+
+
+def print_summary(summary, elapsed, always=False):
+    if not always and not any(summary[name] for name in ("converted", "copied", "failed", "removed")):
+        return
+    text = (f"{summary['converted']} converted, {summary['copied']} copied, {summary['unchanged']} unchanged, "
+            f"{summary['failed']} failed")
+    if summary["removed"]:
+        text += f", {summary['removed']} removed"
+    if summary["waiting"]:
+        text += f", {summary['waiting']} still being written"
+    print(f"{text} in {elapsed:.2f}s")
+
+
+def run_watch(roots, settings, output_dir=None, index_path=None, workers=None, preserve_colors=True,
+              converter_options=None, poll_interval=None, once=False, encoding="text"):
+    # Converts new and changed images under roots, then keeps watching unless once is set.
+    # Returns the totals over the whole run
+    missing = [root for root in roots if not os.path.isdir(root)]
+    if missing:
+        print(f"Not a folder: {', '.join(missing)}")
+        return None
+
+    folder_watcher = FolderWatcher(roots, settings, output_dir=output_dir, index_path=index_path, workers=workers,
+                                   preserve_colors=preserve_colors, converter_options=converter_options,
+                                   encoding=encoding)
+    totals = {"converted": 0, "copied": 0, "unchanged": 0, "failed": 0, "waiting": 0, "removed": 0}
+    watcher = None
+    try:
+        # Watches go in before the first scan, so nothing written during it is missed
+        if not once:
+            watcher = make_watcher(folder_watcher.roots, poll_interval)
+            if isinstance(watcher, PollingWatcher):
+                folder_watcher.settle = SETTLE_SECONDS
+
+        start = time.perf_counter()
+        summary = folder_watcher.rescan()
+        print_summary(summary, time.perf_counter() - start, always=True)
+        for name in totals:
+            totals[name] += summary[name]
+        if once:
+            return totals
+
+        if isinstance(watcher, PollingWatcher):
+            print(f"Polling {', '.join(roots)} every {watcher.interval:g}s, Ctrl+C to stop")
+        else:
+            print(f"Watching {', '.join(roots)}, Ctrl+C to stop")
+        while True:
+            changed = watcher.wait()
+            start = time.perf_counter()
+            summary = folder_watcher.rescan() if changed is None else folder_watcher.changed(changed)
+            print_summary(summary, time.perf_counter() - start)
+            for name in totals:
+                totals[name] += summary[name]
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        if watcher is not None:
+            watcher.close()
+        folder_watcher.close()
+    return totals